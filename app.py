@@ -1,50 +1,231 @@
-from flask import Flask, render_template, request, jsonify, send_file, session
-from sample_data_loader import load_events, load_items
-from sample_recommender import RecommenderSystem
+from flask import Flask, Blueprint, Response, current_app, render_template, request, jsonify, send_file, session
 import os
-import pandas as pd
-from collections import OrderedDict
 import math
-import requests
 import sqlite3
 import json
 import time
 from io import BytesIO
 import threading
+import uuid
+import hashlib
+import logging
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+from backend.cache import StripedLRU
+from backend.request_log import RequestCapture
+from backend.profiling import RequestProfiler
+from backend.thumbnails import ThumbnailStore, PLACEHOLDER_GIF
+from backend import fastjson
+from backend.prewarm import AccessTracker, Prewarmer
+from backend.batching import Coalescer
+from backend.session_cache import session_fingerprint, representative_weights, entry_size
+from backend.sharding import ShardUnavailable
+from backend.instrumentation import (
+    instrument_app, REC_CACHE, MODEL_LATENCY, ENRICH_LATENCY, DB_LATENCY, DB_ERRORS,
+    TRAIN_LATENCY, PREWARM_USERS,
+)
+
+# pandas, scikit-learn and the data loaders are imported lazily (see warm())
+# so importing this module, creating the app and /healthz stay fast.
+
+logger = logging.getLogger(__name__)
+bp = Blueprint('main', __name__)
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('FLASK_SECRET', 'dev-secret')
-
-# Global loader flag: switch between sample and full dataset
-USE_FULL_DATASET = False
-
-def load_events_smart():
-    """Load events from sample or full dataset based on global flag."""
-    global USE_FULL_DATASET
-    if USE_FULL_DATASET:
-        try:
-            from backend.data_loader import load_events as load_events_full
-            return load_events_full()
-        except Exception:
-            print("Full dataset loader not available, falling back to sample")
-            USE_FULL_DATASET = False
-            return load_events()
-    return load_events()
-
-# Global data for the demo
-events_df = load_events_smart()
-model = RecommenderSystem()
 MODEL_PATH = os.path.join('models', 'sample_model.joblib')
-os.makedirs('models', exist_ok=True)
-DB_PATH = os.path.join('models', 'rec_cache.db')
+DB_PATH = os.environ.get('REC_CACHE_DB', os.path.join('models', 'rec_cache.db'))
 
-# Simple in-memory LRU cache for recommendations (define early so DB loader can use it)
+# In-memory LRU caches shared by request threads. Both are lock-striped so
+# lookups for different users rarely contend, and keyed by model version so a
+# result computed against a model that was just swapped out is never served.
+CACHE_STRIPES = int(os.environ.get('CACHE_STRIPES', 16))
+# Recommendations: (user_id, top_k, model_version) -> [item ids]
 REC_CACHE_MAX = 200
-rec_cache = OrderedDict()
 REC_CACHE_TTL = 24 * 3600  # seconds
+rec_cache = StripedLRU(REC_CACHE_MAX, stripes=CACHE_STRIPES)
+
+# Rendered /get_recommendations bodies: (user_id, top_k, model_version) -> (bytes, etag)
+RESPONSE_CACHE_MAX = 1000
+response_cache = StripedLRU(RESPONSE_CACHE_MAX, stripes=CACHE_STRIPES)
+# Session recommendations: (model_version, kind, top_k, canonical session) -> [item ids].
+# Shared by all visitors and bounded by estimated size; sessions whose relative
+# item weights differ by less than SESSION_WEIGHT_TOLERANCE share an entry
+# (see backend/session_cache.py). SESSION_CACHE_MB=0 disables it.
+SESSION_CACHE_MB = float(os.environ.get('SESSION_CACHE_MB', 16))
+SESSION_WEIGHT_TOLERANCE = float(os.environ.get('SESSION_WEIGHT_TOLERANCE', 0.1))
+session_cache = StripedLRU(10 ** 6, stripes=CACHE_STRIPES, max_bytes=int(SESSION_CACHE_MB * 2 ** 20),
+                           sizeof=entry_size)
+
+# Browsers may reuse a response this long before revalidating with If-None-Match.
+# The default 0 revalidates every time (cheap: a 304 from the response cache),
+# so results replaced by /refresh_recs or a new model are never shown stale.
+RESPONSE_MAX_AGE = int(os.environ.get('RESPONSE_MAX_AGE', 0))
+# Largest k a request may ask for; k sizes cache keys and scoring work
+MAX_K = int(os.environ.get('MAX_K', 50))
+# Most users one POST /prewarm_top_users call scores (synchronously, in the request)
+PREWARM_TOP_MAX = int(os.environ.get('PREWARM_TOP_MAX', 1000))
+
+# Loader used at startup: sample or full dataset (/switch_loader changes the live one)
+USE_FULL_DATASET = False
+
+
+class ServingState(NamedTuple):
+    """Everything a request reads about the model and dataset.
+
+    Never mutated: a swap builds a new snapshot and replaces `state` with a
+    single assignment, so a request that reads `state` once sees a consistent
+    model, version and dataset even while a swap happens.
+    """
+    model: object = None
+    # Identifies the loaded model; changes whenever a different model is installed
+    version: Optional[str] = None
+    # Events DataFrame, or None when only `meta` is kept
+    events: object = None
+    # demo_users / top_users / events_count (from the pipeline's popularity
+    # stage or the shared model's manifest); read-only
+    meta: Mapping = MappingProxyType({})
+    use_full: bool = False
+
+
+# Serving snapshot, filled in by warm()
+state = ServingState(use_full=USE_FULL_DATASET)
+# Serialises writers (builds, loader switches, shared reloads); readers never take it
+_swap_lock = threading.RLock()
+
+# Content-addressed cache of training stages (see backend/pipeline.py)
+PIPELINE_DIR = os.environ.get('PIPELINE_DIR', os.path.join('models', 'pipeline'))
+
+# Share of the "viewed/bought together" co-occurrence signal in session
+# scores; when set, it is built from data/raw/events.csv whenever the model is
+# trained. Opt-in: the default 0 keeps session scores similarity-only.
+COOC_BLEND = float(os.environ.get('COOC_BLEND', 0))
+
+# Filters for the full dataset loader, applied while streaming events.csv
+# (see backend/data_loader.EventStream): most active users/items, minimum
+# events per user/item, and a timestamp range in epoch ms. Unset: no filter.
+FULL_LOADER_FILTERS = {
+    'max_users': 'FULL_MAX_USERS',
+    'max_items': 'FULL_MAX_ITEMS',
+    'min_user_events': 'FULL_MIN_USER_EVENTS',
+    'min_item_events': 'FULL_MIN_ITEM_EVENTS',
+    'start': 'FULL_START_MS',
+    'end': 'FULL_END_MS',
+}
+
+# Time-decayed training weights: an interaction's weight halves every
+# TRAIN_HALF_LIFE_DAYS, and only the last TRAIN_WINDOW_DAYS of events (before
+# the newest one) are used. Unset (default) keeps static weights over all history.
+TRAIN_HALF_LIFE_DAYS = os.environ.get('TRAIN_HALF_LIFE_DAYS')
+TRAIN_WINDOW_DAYS = os.environ.get('TRAIN_WINDOW_DAYS')
+
+# Storage precision of the model arrays: float64, float32, float16 or int8
+# (see scripts/check_precision.py for the accuracy/size trade-off)
+MODEL_PRECISION = os.environ.get('MODEL_PRECISION', 'float64')
+
+# Set SHARED_MODEL_DIR to attach a model published by scripts/serve.py instead
+# of loading events and the model in this process (read-only; see backend/shared_model.py)
+SHARED_MODEL_DIR = os.environ.get('SHARED_MODEL_DIR')
+_shared_watcher = None
+
+# Set SHARD_DIR to serve user recommendations from shard workers built by
+# scripts/build_shards.py and run by scripts/shard_workers.py; sessions are
+# still scored in this process from the shards' item model. SHARD_ADDRESSES
+# overrides the default unix sockets ('host:port,...' or socket paths). The
+# IPC key is SHARD_AUTHKEY, or the random one build_shards.py stores in SHARD_DIR.
+SHARD_DIR = os.environ.get('SHARD_DIR')
+SHARD_ADDRESSES = os.environ.get('SHARD_ADDRESSES')
+# Most user ids one /get_recommendations_batch call may ask for
+BATCH_MAX_USERS = int(os.environ.get('BATCH_MAX_USERS', 1000))
+
+# Thumbnails are fetched off the request path with bounded concurrency;
+# THUMB_UPSTREAM is a URL template with an {item_id} placeholder.
+thumbnails = ThumbnailStore(
+    os.path.join('static', 'thumbs'),
+    upstream=os.environ.get('THUMB_UPSTREAM'),
+    max_workers=int(os.environ.get('THUMB_FETCH_WORKERS', 4)),
+)
+
+# Demand-driven prewarm: /get_recommendations requests feed a decayed sketch and
+# predicted hot keys missing from the cache (evicted, or after a model swap) are
+# scored in batches. PREWARM_INTERVAL=0 disables the background loop.
+PREWARM_INTERVAL = float(os.environ.get('PREWARM_INTERVAL', 60))
+access_tracker = AccessTracker(half_life=float(os.environ.get('PREWARM_HALF_LIFE', 3600)))
+
+
+def prewarm_batch(keys):
+    """Score a batch of (user_id, top_k) keys at once, store them in the rec
+    cache and SQLite, and render their /get_recommendations bodies so the
+    next request is a response-cache hit."""
+    if not _ready.is_set():
+        return 0
+    from sample_data_loader import load_items
+
+    snap = state
+    by_k = {}
+    for user_id, top_k in keys:
+        by_k.setdefault(top_k, []).append(user_id)
+    rows = []
+    for top_k, users in by_k.items():
+        with MODEL_LATENCY.time(method='recommend_batch'):
+            results = snap.model.recommend_batch(users, top_k=top_k)
+        for user_id, recs in results.items():
+            rec_cache.set((user_id, top_k, snap.version), recs)
+            rows.append((user_id, top_k, recs))
+    persist_recommendations_many(rows, snap.version)
+    # One item lookup for the whole batch instead of one per user
+    with ENRICH_LATENCY.time(stage='load_items'):
+        items_info = load_items(relevant_product_ids=sorted({i for _, _, recs in rows for i in recs}))
+    for user_id, top_k, recs in rows:
+        store_rendered(user_id, top_k, recs, snap, items_info)
+    return len(rows)
+
+
+prewarmer = Prewarmer(
+    access_tracker, prewarm_batch,
+    is_cached=lambda key: (key[0], key[1], state.version) in response_cache,
+    # The hot set must fit in the LRU cache alongside organic traffic
+    hot_size=int(os.environ.get('PREWARM_HOT_SIZE', REC_CACHE_MAX // 2)),
+    interval=PREWARM_INTERVAL,
+    batch_size=int(os.environ.get('PREWARM_BATCH', 32)),
+    cpu_budget=float(os.environ.get('PREWARM_CPU_BUDGET', 0.1)),
+)
+
+
+# Micro-batching of cache misses (opt-in): concurrent misses for the same k and
+# model are scored together in one recommend_batch call. A miss waits at most
+# BATCH_WINDOW_MS for others to join (and only while another batch is being
+# scored), or until BATCH_MAX_SIZE users are queued. It raises throughput and
+# cuts tail latency under heavy miss traffic, but multiplies median latency
+# (see the README), so the default 0 scores every miss on its own.
+def _score_misses(context, user_ids):
+    model, top_k = context
+    with MODEL_LATENCY.time(method='recommend_batch'):
+        return model.recommend_batch(user_ids, top_k=top_k)
+
+
+miss_batcher = Coalescer(
+    _score_misses,
+    max_batch=int(os.environ.get('BATCH_MAX_SIZE', 64)),
+    max_wait=float(os.environ.get('BATCH_WINDOW_MS', 0)) / 1000.0,
+    name='recommend',
+)
+
+
+def start_prewarmer():
+    if PREWARM_INTERVAL > 0:
+        prewarmer.start()
+
+# Routes that answer before the model is warm
+UNGATED_PATHS = ('/healthz', '/readyz', '/metrics')
+
+_warm_lock = threading.Lock()
+_warm_thread = None
+_ready = threading.Event()
+_warm_state = {'state': 'cold', 'error': None, 'started': None, 'finished': None}
+
 
 # Initialize sqlite DB for persisted recommendation cache
 def init_db():
+    os.makedirs(os.path.dirname(DB_PATH) or '.', exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''
@@ -53,164 +234,508 @@ def init_db():
             top_k INTEGER,
             recs TEXT,
             ts REAL,
+            model_version TEXT,
             PRIMARY KEY (user_id, top_k)
         )
     ''')
+    # Tables created before rows were tagged with their model: old rows keep
+    # a NULL version and are never loaded
+    columns = [row[1] for row in c.execute('PRAGMA table_info(rec_cache)')]
+    if 'model_version' not in columns:
+        c.execute('ALTER TABLE rec_cache ADD COLUMN model_version TEXT')
     conn.commit()
     conn.close()
 
-init_db()
-# Load recent entries into in-memory cache
+# Load recent entries for the current model into in-memory cache
 def load_db_cache(limit=REC_CACHE_MAX):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT user_id, top_k, recs, ts FROM rec_cache ORDER BY ts DESC LIMIT ?', (limit,))
+    version = state.version
+    with DB_LATENCY.time(op='read'):
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+        c.execute('SELECT user_id, top_k, recs, ts FROM rec_cache WHERE model_version=? '
+                  'ORDER BY ts DESC LIMIT ?', (version, limit))
+        rows = c.fetchall()
+        conn.close()
     now = time.time()
-    for user_id, top_k, recs, ts in c.fetchall():
+    # Rows are newest first; insert oldest first so LRU order matches recency
+    for user_id, top_k, recs, ts in reversed(rows):
         # skip expired entries
         try:
             if now - float(ts) > REC_CACHE_TTL:
                 continue
         except Exception:
             continue
-        key = f"{user_id}:{top_k}"
         try:
-            rec_cache[key] = json.loads(recs)
+            rec_cache.set((user_id, top_k, version), json.loads(recs))
         except Exception:
             continue
-    conn.close()
 
-load_db_cache()
-
-# Try loading persisted model if available; otherwise train and save
-if os.path.exists(MODEL_PATH):
+def full_loader_params():
+    return {name: int(os.environ[var]) for name, var in FULL_LOADER_FILTERS.items() if os.environ.get(var)}
+
+def make_pipeline(cooc=True, use_full=None):
+    """Training pipeline for a loader (default: the startup one), the precision and co-occurrence settings."""
+    from backend.pipeline import TrainingPipeline
+    use_full = USE_FULL_DATASET if use_full is None else use_full
+    return TrainingPipeline(
+        PIPELINE_DIR,
+        loader='full' if use_full else 'sample',
+        loader_params=full_loader_params() if use_full else None,
+        precision=MODEL_PRECISION,
+        cooc_params={} if cooc and COOC_BLEND > 0 else None,
+        weighting={
+            'half_life': float(TRAIN_HALF_LIFE_DAYS) * 86400 if TRAIN_HALF_LIFE_DAYS else None,
+            'window': float(TRAIN_WINDOW_DAYS) * 86400 if TRAIN_WINDOW_DAYS else None,
+        },
+    )
+
+def install(new_model, version, events=None, meta=None, use_full=None):
+    """Publish a new serving snapshot and drop results cached for the old model."""
+    global state
+    with _swap_lock:
+        previous = state
+        state = ServingState(
+            model=new_model,
+            version=version,
+            events=events,
+            meta=MappingProxyType(dict(meta or {})),
+            use_full=previous.use_full if use_full is None else use_full,
+        )
+    if previous.version is not None and previous.version != version:
+        # Entries are keyed by version, so clearing only frees memory; requests
+        # still running on the old snapshot may add a few more that age out
+        rec_cache.clear()
+        clear_response_cache()
+        session_cache.clear()
+        prewarmer.kick()
+    return state
+
+def train_pipeline(use_full=None):
+    """Return (pipeline, model) built with the serving settings for a loader.
+
+    Shared by build_model and scripts that precompute results for the app, so
+    both score with the same model. A failed co-occurrence stage falls back to
+    similarity only.
+    """
+    pipeline = make_pipeline(use_full=use_full)
     try:
-        model.load(MODEL_PATH)
+        model = pipeline.build()
     except Exception:
-        model.train(events_df)
-        model.save(MODEL_PATH)
-else:
-    model.train(events_df)
+        if pipeline.cooc_params is None:
+            raise
+        logger.exception('Co-occurrence build failed; using similarity only')
+        pipeline = make_pipeline(cooc=False, use_full=use_full)
+        model = pipeline.build()
+    model.cooc_blend = COOC_BLEND
+    return pipeline, model
+
+def pipeline_version(pipeline):
+    """Version the app serves a pipeline's artifact under (caches are keyed by it)."""
+    return f"local-{pipeline.key('artifact')[:12]}"
+
+def build_model(reason, use_full=None):
+    """Load the model for a dataset, rebuilding only stale pipeline stages.
+
+    An unchanged events.csv loads the cached artifact directly; the run is
+    recorded in the training histogram only when something was rebuilt.
+    Builds run one at a time; requests keep using the current snapshot
+    until the new one is installed.
+    """
+    use_full = state.use_full if use_full is None else use_full
+    with _swap_lock:
+        started = time.perf_counter()
+        try:
+            pipeline, new_model = train_pipeline(use_full)
+            meta = pipeline.get('popularity')
+        except Exception:
+            if not use_full:
+                raise
+            logger.warning("Full dataset loader not available, falling back to sample")
+            return build_model(reason, use_full=False)
+        if pipeline.built_anything():
+            TRAIN_LATENCY.observe(time.perf_counter() - started, reason=reason)
+        logger.info('Model %s (%s)', pipeline.key('artifact')[:12],
+                    ', '.join(f'{stage}={result}' for stage, result in pipeline.report.items()))
+        return install(new_model, pipeline_version(pipeline), meta=meta, use_full=use_full)
+
+def attach_shared_model(manifest=None):
+    """Swap in the shared model version published under SHARED_MODEL_DIR."""
+    global _shared_watcher
+    from backend.shared_model import attach, ManifestWatcher
+    from sample_recommender import RecommenderSystem
+    with _swap_lock:
+        new_model, arrays, manifest = attach(SHARED_MODEL_DIR, RecommenderSystem, manifest)
+        meta = dict(manifest.get('meta', {}))
+        meta['top_users'] = arrays.get('top_users')
+        new_model.cooc_blend = COOC_BLEND
+        install(new_model, str(manifest['version']), meta=meta, use_full=bool(meta.get('use_full_dataset')))
+        if _shared_watcher is None:
+            _shared_watcher = ManifestWatcher(SHARED_MODEL_DIR, version=manifest['version'])
+    logger.info('Attached shared model version %s', manifest['version'])
+
+def attach_sharded_model(manifest=None):
+    """Route user recommendations to the shard workers for the shards under SHARD_DIR."""
+    global _shared_watcher
+    from backend.sharding import attach_sharded, parse_addresses, ITEMS_DIR
+    from backend.shared_model import ManifestWatcher
+    addresses = parse_addresses(SHARD_ADDRESSES) if SHARD_ADDRESSES else None
+    with _swap_lock:
+        new_model, arrays, manifest = attach_sharded(SHARD_DIR, addresses)
+        meta = dict(manifest.get('meta', {}))
+        meta['top_users'] = arrays.get('top_users')
+        new_model.item_model.cooc_blend = COOC_BLEND
+        install(new_model, f"shards-{manifest['version']}", meta=meta,
+                use_full=bool(meta.get('use_full_dataset')))
+        if _shared_watcher is None:
+            _shared_watcher = ManifestWatcher(os.path.join(SHARD_DIR, ITEMS_DIR), version=manifest['version'])
+    logger.info('Attached %d shards, version %s', manifest['meta']['n_shards'], manifest['version'])
+
+def poll_shared_model():
+    """Reload the shared model if a newer version was published (cheap no-op otherwise)."""
+    if _shared_watcher is None or not _ready.is_set():
+        return
+    manifest = _shared_watcher.poll()
+    if manifest is not None:
+        try:
+            if SHARD_DIR:
+                attach_sharded_model(manifest)
+            else:
+                attach_shared_model(manifest)
+        except Exception:
+            logger.exception('Failed to attach shared model version %s', manifest.get('version'))
+
+def warm():
+    """Load the SQLite cache and the model. Safe to call repeatedly."""
+    if _ready.is_set():
+        return True
+    with _warm_lock:
+        if _ready.is_set():
+            return True
+        _warm_state.update(state='warming', error=None, started=time.time())
+        try:
+            init_db()
+            if SHARED_MODEL_DIR:
+                attach_shared_model()
+            elif SHARD_DIR:
+                attach_sharded_model()
+            else:
+                build_model('startup')
+                load_db_cache()
+        except Exception as e:
+            logger.exception('Warmup failed')
+            _warm_state.update(state='failed', error=str(e), finished=time.time())
+            return False
+        _warm_state.update(state='ready', finished=time.time())
+        _ready.set()
+        logger.info('Warm in %.2fs', _warm_state['finished'] - _warm_state['started'])
+        return True
+
+def start_warmup():
+    """Warm in a background thread (idempotent); returns immediately."""
+    global _warm_thread
+    with _warm_lock:
+        if _ready.is_set() or (_warm_thread is not None and _warm_thread.is_alive()):
+            return
+        _warm_thread = threading.Thread(target=warm, name='warmup', daemon=True)
+        _warm_thread.start()
+
+def is_ready():
+    return _ready.is_set()
+
+@bp.before_app_request
+def require_warm():
+    """Hold traffic until the model is warm.
+
+    In testing (or with WARM_ON_REQUEST) the first request warms synchronously;
+    otherwise warming starts in the background and callers get a 503 with
+    Retry-After until /readyz reports ready.
+    """
+    if _ready.is_set():
+        poll_shared_model()
+        return None
+    if request.path in UNGATED_PATHS:
+        return None
+    if current_app.testing or current_app.config.get('WARM_ON_REQUEST'):
+        if warm():
+            return None
+    else:
+        start_warmup()
+    response = jsonify({'error': 'warming_up', 'state': _warm_state['state']})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+@bp.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/readyz')
+def readyz():
+    """Readiness: 200 once the model is loaded, 503 while warming or after a failure."""
+    body = {'ready': _ready.is_set(), 'state': _warm_state['state']}
+    if _warm_state['error']:
+        body['error'] = _warm_state['error']
+    if _warm_state['started'] and _warm_state['finished']:
+        body['warmup_s'] = round(_warm_state['finished'] - _warm_state['started'], 3)
+    return jsonify(body), (200 if body['ready'] else 503)
+
+def persist_recommendations(user_id, top_k, recs, version):
+    """Write recommendations scored by model `version` to the SQLite cache (best effort)."""
+    persist_recommendations_many([(user_id, top_k, recs)], version)
+
+def persist_recommendations_many(rows, version):
+    """Write (user_id, top_k, recs) rows scored by model `version` to the SQLite
+    cache in one transaction (best effort)."""
+    if not rows:
+        return
+    now = time.time()
     try:
-        model.save(MODEL_PATH)
+        with DB_LATENCY.time(op='write'):
+            conn = sqlite3.connect(DB_PATH)
+            c = conn.cursor()
+            c.executemany('REPLACE INTO rec_cache (user_id, top_k, recs, ts, model_version) VALUES (?,?,?,?,?)',
+                          [(int(u), int(k), json.dumps(recs), now, version) for u, k, recs in rows])
+            conn.commit()
+            conn.close()
     except Exception:
-        pass
-
-# Simple in-memory LRU cache for recommendations
-REC_CACHE_MAX = 200
-rec_cache = OrderedDict()
+        DB_ERRORS.inc(op='write')
 
 def get_cached_recommendations(user_id, top_k=5):
-    key = f"{user_id}:{top_k}"
-    if key in rec_cache:
-        # move to end (most recently used)
-        rec_cache.move_to_end(key)
-        return rec_cache[key]
-    recs = model.recommend(user_id, top_k=top_k)
-    rec_cache[key] = recs
+    return lookup_recommendations(user_id, top_k)[0]
+
+def lookup_recommendations(user_id, top_k=5, snap=None):
+    """Return (recs, cache_hit) for a user against one serving snapshot."""
+    snap = snap or state
+    key = (user_id, top_k, snap.version)
+    recs = rec_cache.get(key)
+    if recs is not None:
+        REC_CACHE.inc(tier='memory', result='hit')
+        return recs, True
+    REC_CACHE.inc(tier='memory', result='miss')
+    recs = miss_batcher.submit((snap.version, top_k), user_id, context=(snap.model, top_k))
+    rec_cache.set(key, recs)
     # persist to DB
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('REPLACE INTO rec_cache (user_id, top_k, recs, ts) VALUES (?,?,?,?)',
-                  (user_id, top_k, json.dumps(recs), time.time()))
-        conn.commit()
-        conn.close()
-    except Exception:
-        pass
-    if len(rec_cache) > REC_CACHE_MAX:
-        rec_cache.popitem(last=False)
-    return recs
-
+    persist_recommendations(user_id, top_k, recs, snap.version)
+    return recs, False
 
-@app.route('/thumb/<int:item_id>')
+def clear_response_cache(user_id=None):
+    """Drop rendered responses (all, or one user's)."""
+    if user_id is None:
+        response_cache.clear()
+    else:
+        response_cache.discard_where(lambda key: key[0] == user_id)
+
+def render_recommendations(user_id, top_k):
+    """Return (body, etag, cache_hit) for a user's rendered recommendations.
+
+    A hit returns the stored bytes as-is; a miss scores (or reuses the rec
+    cache), enriches the items and encodes once.
+    """
+    snap = state
+    key = (user_id, top_k, snap.version)
+    entry = response_cache.get(key)
+    if entry is not None:
+        REC_CACHE.inc(tier='response', result='hit')
+        return entry[0], entry[1], True
+    REC_CACHE.inc(tier='response', result='miss')
+
+    recs, cache_hit = lookup_recommendations(user_id, top_k=top_k, snap=snap)
+    body, etag = store_rendered(user_id, top_k, recs, snap)
+    return body, etag, cache_hit
+
+def store_rendered(user_id, top_k, recs, snap, items_info=None):
+    """Enrich and encode `recs` once and store the body for `snap`'s version;
+    returns (body, etag). Used by requests and the prewarmer alike."""
+    thumbnails.prefetch(recs)
+    body = fastjson.dumps(describe_items(recs, items_info))
+    etag = hashlib.sha1(body).hexdigest()
+    response_cache.set((user_id, top_k, snap.version), (body, etag))
+    return body, etag
+
+
+@bp.route('/thumb/<int:item_id>')
 def thumb(item_id):
-    """Serve a cached thumbnail, fetching from Picsum on first request."""
-    static_dir = os.path.join('static', 'thumbs')
-    os.makedirs(static_dir, exist_ok=True)
-    img_path = os.path.join(static_dir, f"{item_id}.jpg")
-    if os.path.exists(img_path):
-        return send_file(img_path, mimetype='image/jpeg')
-    # Fetch from picsum and cache
-    try:
-        url = f"https://picsum.photos/seed/{item_id}/200/200"
-        r = requests.get(url, timeout=10)
-        if r.status_code == 200:
-            with open(img_path, 'wb') as f:
-                f.write(r.content)
-            return send_file(img_path, mimetype='image/jpeg')
-    except Exception:
-        pass
-    # Fallback: return a 1x1 transparent
-    return send_file(BytesIO(b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"), mimetype='image/gif')
-
-@app.route('/')
+    """Serve a cached thumbnail; on a miss return a placeholder and fetch in the background."""
+    found = thumbnails.lookup(item_id)
+    if found is not None:
+        path, mimetype = found
+        return send_file(os.path.abspath(path), mimetype=mimetype, max_age=7 * 24 * 3600)
+    thumbnails.fetch_async(item_id)
+    response = send_file(BytesIO(PLACEHOLDER_GIF), mimetype='image/gif')
+    # Let the browser ask again once the real image is stored
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def demo_users(n=10):
+    """First `n` user ids for the UI dropdown."""
+    snap = state
+    if snap.events is None:
+        return list(snap.meta.get('demo_users', []))[:n]
+    return snap.events['user_id'].unique()[:n].tolist()
+
+def top_users(n):
+    """The `n` most active users by event count."""
+    n = max(n, 0)
+    snap = state
+    if snap.events is None:
+        users = snap.meta.get('top_users')
+        return [] if users is None else [int(u) for u in users[:n]]
+    return snap.events['user_id'].value_counts().nlargest(n).index.tolist()
+
+def events_count():
+    snap = state
+    if snap.events is None:
+        return int(snap.meta.get('events_count', 0))
+    return len(snap.events)
+
+def describe_items(recs, items_info=None):
+    """Attach display names and thumbnail URLs to a list of item ids.
+
+    `items_info` (a `load_items` frame covering `recs`) skips the lookup.
+    """
+    import pandas as pd
+    from sample_data_loader import load_items
+
+    if items_info is None:
+        with ENRICH_LATENCY.time(stage='load_items'):
+            items_info = load_items(relevant_product_ids=recs)
+
+    with ENRICH_LATENCY.time(stage='build'):
+        result = []
+        for r in recs:
+            # Get a property name for the UI 
+            details = items_info[items_info['itemid'] == r]
+            if details.empty:
+                name = f"Item {r}"
+            else:
+                if 'display_name' in details.columns and pd.notna(details.iloc[0]['display_name']):
+                    name = details.iloc[0]['display_name']
+                elif 'value' in details.columns and pd.notna(details.iloc[0]['value']):
+                    name = details.iloc[0]['value']
+                else:
+                    name = f"Item {r}"
+            # Provide a thumbnail URL (picsum seed) for nicer UI without bundling images
+            image_url = f"/thumb/{r}"
+            result.append({"id": r, "display_name": name, "image_url": image_url})
+    return result
+
+@bp.route('/')
 def index():
-    users = events_df['user_id'].unique()[:10].tolist()
+    users = demo_users(10)
     return render_template('index.html', users=users)
 
-@app.route('/get_recommendations/<int:user_id>')
-def get_rec(user_id):
-    # Optional API key enforcement: set DEMO_API_KEY env var to require header 'X-API-Key'
+def check_api_key():
+    """Optional API key enforcement: set DEMO_API_KEY env var to require header 'X-API-Key'.
+
+    Returns an error response, or None when the request may proceed.
+    """
     api_key = os.environ.get('DEMO_API_KEY')
     if api_key:
         provided = request.headers.get('X-API-Key') or request.args.get('api_key')
         if provided != api_key:
             return jsonify({'error': 'invalid_api_key'}), 401
+    return None
 
-    recs = get_cached_recommendations(user_id, top_k=6)
-    items_info = load_items(relevant_product_ids=recs)
-    
-    result = []
-    for r in recs:
-        # Get a property name for the UI 
-        details = items_info[items_info['itemid'] == r]
-        if details.empty:
-            name = f"Item {r}"
-        else:
-            if 'display_name' in details.columns and pd.notna(details.iloc[0]['display_name']):
-                name = details.iloc[0]['display_name']
-            elif 'value' in details.columns and pd.notna(details.iloc[0]['value']):
-                name = details.iloc[0]['value']
-            else:
-                name = f"Item {r}"
-        # Provide a thumbnail URL (picsum seed) for nicer UI without bundling images
-        image_url = f"/thumb/{r}"
-        result.append({"id": r, "display_name": name, "image_url": image_url})
-        
-    return jsonify(result)
-
+def requested_k(default=6):
+    """The `?k=` query argument, clamped to 1..MAX_K."""
+    return min(max(request.args.get('k', default=default, type=int), 1), MAX_K)
 
-@app.route('/cache_status/<int:user_id>')
+@bp.route('/get_recommendations/<int:user_id>')
+def get_rec(user_id):
+    denied = check_api_key()
+    if denied:
+        return denied
+
+    top_k = requested_k()
+    access_tracker.record((user_id, top_k))
+    body, etag, cache_hit = render_recommendations(user_id, top_k)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (f'private, max-age={RESPONSE_MAX_AGE}' if RESPONSE_MAX_AGE > 0
+                                         else 'private, no-cache')
+    response.headers['X-Cache'] = 'hit' if cache_hit else 'miss'
+    # 304 with an empty body when If-None-Match matches
+    return response.make_conditional(request)
+
+
+@bp.route('/get_recommendations_batch', methods=['POST'])
+def get_rec_batch():
+    """Recommendation ids for many users: {"user_ids": [...], "k": 6}.
+
+    Cached users are answered from the rec cache; the rest are scored in one
+    batch (fanned out to the shard workers in sharded mode).
+    """
+    denied = check_api_key()
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    user_ids = body.get('user_ids')
+    top_k = body.get('k', 6)
+    # bool is a subclass of int; true/false are not ids
+    if (not isinstance(user_ids, list)
+            or not all(isinstance(u, int) and not isinstance(u, bool) for u in user_ids)
+            or not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= MAX_K):
+        return jsonify({'error': f'expected {{"user_ids": [int, ...], "k": 1..{MAX_K}}}'}), 400
+    if len(user_ids) > BATCH_MAX_USERS:
+        return jsonify({'error': f'at most {BATCH_MAX_USERS} user_ids per call'}), 400
+
+    snap = state
+    found, missing = {}, []
+    for user_id in dict.fromkeys(user_ids):
+        access_tracker.record((user_id, top_k))
+        recs = rec_cache.get((user_id, top_k, snap.version))
+        if recs is None:
+            missing.append(user_id)
+        else:
+            found[user_id] = recs
+    REC_CACHE.inc(len(found), tier='memory', result='hit')
+    if missing:
+        REC_CACHE.inc(len(missing), tier='memory', result='miss')
+        with MODEL_LATENCY.time(method='recommend_batch'):
+            scored = snap.model.recommend_batch(missing, top_k=top_k)
+        for user_id, recs in scored.items():
+            rec_cache.set((user_id, top_k, snap.version), recs)
+        found.update(scored)
+        persist_recommendations_many([(u, top_k, scored[u]) for u in missing], snap.version)
+    return jsonify({'k': top_k, 'results': [{'user_id': u, 'items': found[u]} for u in user_ids]})
+
+
+@bp.route('/cache_status/<int:user_id>')
 def cache_status(user_id):
     """Check if user recommendations are cached."""
-    top_k = request.args.get('k', default=6, type=int)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT recs FROM rec_cache WHERE user_id=? AND top_k=?', (user_id, top_k))
-    row = c.fetchone()
-    conn.close()
+    top_k = requested_k()
+    with DB_LATENCY.time(op='read'):
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+        c.execute('SELECT recs FROM rec_cache WHERE user_id=? AND top_k=? AND model_version=?',
+                  (user_id, top_k, state.version))
+        row = c.fetchone()
+        conn.close()
     return jsonify({'cached': bool(row)})
 
 
-@app.route('/signin', methods=['POST'])
+@bp.route('/signin', methods=['POST'])
 def signin():
     # create ephemeral session and store session item interactions
     session.clear()
     session['signed_in'] = True
+    session['sid'] = uuid.uuid4().hex
     session['session_items'] = []
     session['session_events'] = {}  # item_id -> {'view':int,'click':int,'timestamps':[]}
     session['session_start_time'] = time.time()
     return jsonify({'status': 'signed_in'})
 
 
-@app.route('/signout', methods=['POST'])
+@bp.route('/signout', methods=['POST'])
 def signout():
     session.clear()
     return jsonify({'status': 'signed_out'})
 
 
-@app.route('/session_status')
+@bp.route('/session_status')
 def session_status():
     # include session summary counts and per-item CTR
     signed = bool(session.get('signed_in', False))
@@ -235,7 +760,7 @@ def session_status():
     })
 
 
-@app.route('/session_event', methods=['POST'])
+@bp.route('/session_event', methods=['POST'])
 def session_event():
     data = request.get_json() or {}
     item_id = data.get('item_id')
@@ -269,7 +794,42 @@ def session_event():
     return jsonify({'status': 'ok', 'session_items': session['session_items']})
 
 
-@app.route('/get_session_recommendations')
+def session_recommendations(weights, session_items, top_k=6, snap=None):
+    """Recommendations for a session, shared through `session_cache`.
+
+    Weighted sessions are keyed (and scored) by their canonical fingerprint;
+    sessions without weights by their sorted item list.
+    """
+    snap = snap or state
+    use_cache = SESSION_CACHE_MB > 0 and SESSION_WEIGHT_TOLERANCE > 0
+    if weights:
+        if use_cache:
+            fingerprint = session_fingerprint(weights, SESSION_WEIGHT_TOLERANCE)
+            key = (snap.version, 'weighted', top_k, fingerprint)
+            weights = representative_weights(fingerprint, SESSION_WEIGHT_TOLERANCE)
+    else:
+        key = (snap.version, 'items', top_k, tuple(sorted(session_items)))
+    if use_cache:
+        recs = session_cache.get(key)
+        if recs is not None:
+            REC_CACHE.inc(tier='session', result='hit')
+            return recs
+        REC_CACHE.inc(tier='session', result='miss')
+    try:
+        if weights:
+            with MODEL_LATENCY.time(method='recommend_for_session_with_weights'):
+                recs = snap.model.recommend_for_session_with_weights(weights, top_k=top_k)
+        else:
+            with MODEL_LATENCY.time(method='recommend_for_session'):
+                recs = snap.model.recommend_for_session(session_items, top_k=top_k)
+    except Exception:
+        return []
+    if use_cache:
+        session_cache.set(key, recs)
+    return recs
+
+
+@bp.route('/get_session_recommendations')
 def get_session_recommendations():
     if not session.get('signed_in'):
         return jsonify([])
@@ -297,120 +857,138 @@ def get_session_recommendations():
             w = base_w
         if w > 0:
             weights[iid] = w
-    recs = []
-    try:
-        if weights:
-            recs = model.recommend_for_session_with_weights(weights, top_k=6)
-        else:
-            recs = model.recommend_for_session(session.get('session_items', []), top_k=6)
-    except Exception:
-        recs = []
-    items_info = load_items(relevant_product_ids=recs)
-    result = []
-    for r in recs:
-        details = items_info[items_info['itemid'] == r]
-        if details.empty:
-            name = f"Item {r}"
-        else:
-            if 'display_name' in details.columns and pd.notna(details.iloc[0]['display_name']):
-                name = details.iloc[0]['display_name']
-            elif 'value' in details.columns and pd.notna(details.iloc[0]['value']):
-                name = details.iloc[0]['value']
-            else:
-                name = f"Item {r}"
-        image_url = f"/thumb/{r}"
-        result.append({"id": r, "display_name": name, "image_url": image_url})
+    recs = session_recommendations(weights, session.get('session_items', []), top_k=6)
+    thumbnails.prefetch(recs)
+    result = describe_items(recs)
     return jsonify(result)
 
 
-@app.route('/refresh_recs/<int:user_id>', methods=['POST'])
+@bp.route('/refresh_recs/<int:user_id>', methods=['POST'])
 def refresh_recs(user_id):
     """Recompute recommendations for user."""
-    top_k = request.args.get('k', default=6, type=int)
-    recs = model.recommend(user_id, top_k=top_k)
+    top_k = requested_k()
+    snap = state
+    with MODEL_LATENCY.time(method='recommend'):
+        recs = snap.model.recommend(user_id, top_k=top_k)
     # persist to DB
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('REPLACE INTO rec_cache (user_id, top_k, recs, ts) VALUES (?,?,?,?)',
-                  (user_id, top_k, json.dumps(recs), time.time()))
-        conn.commit()
-        conn.close()
-    except Exception:
-        pass
+    persist_recommendations(user_id, top_k, recs, snap.version)
     # update in-memory
-    rec_cache[f"{user_id}:{top_k}"] = recs
+    rec_cache.set((user_id, top_k, snap.version), recs)
+    clear_response_cache(user_id)
     return jsonify({'recs': recs})
 
 
-@app.route('/prewarm_top_users', methods=['POST'])
+@bp.route('/prewarm_top_users', methods=['POST'])
 def prewarm_top_users():
-    """Prewarm cache for top users."""
-    n = request.args.get('n', default=50, type=int)
-    k = request.args.get('k', default=6, type=int)
+    """Prewarm cache for top users (by historical activity) in batches."""
+    n = min(max(request.args.get('n', default=50, type=int), 0), PREWARM_TOP_MAX)
+    k = requested_k()
     # find top users
-    users = events_df['user_id'].value_counts().nlargest(n).index.tolist()
-    for u in users:
-        recs = model.recommend(u, top_k=k)
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute('REPLACE INTO rec_cache (user_id, top_k, recs, ts) VALUES (?,?,?,?)',
-                      (int(u), int(k), json.dumps(recs), time.time()))
-            conn.commit()
-            conn.close()
-        except Exception:
-            pass
+    users = top_users(n)
+    for start in range(0, len(users), prewarmer.batch_size):
+        prewarm_batch([(u, k) for u in users[start:start + prewarmer.batch_size]])
+    PREWARM_USERS.inc(len(users), source='endpoint')
     return jsonify({'status': 'ok', 'n': len(users)})
 
 
-@app.route('/switch_loader', methods=['POST'])
+@bp.route('/prewarm_status')
+def prewarm_status():
+    """Predicted hot set and what is still due for prewarming."""
+    hot = access_tracker.hot(prewarmer.hot_size, min_score=prewarmer.min_score)
+    return jsonify({
+        'tracked': len(access_tracker),
+        'hot': [{'user_id': u, 'k': k} for u, k in hot],
+        'due': prewarmer.pending_count(),
+        'running': prewarmer.running,
+    })
+
+
+@bp.route('/switch_loader', methods=['POST'])
 def switch_loader():
     """Toggle between sample and full dataset loaders."""
-    global USE_FULL_DATASET, events_df
+    if SHARED_MODEL_DIR or SHARD_DIR:
+        # Workers only read the shared model or shards; retrain and publish via
+        # scripts/serve.py or scripts/build_shards.py
+        return jsonify({'error': 'shared_model_readonly'}), 409
     toggle = request.get_json().get('use_full', False)
-    USE_FULL_DATASET = bool(toggle)
     try:
-        events_df = load_events_smart()
-        # retrain model on new dataset
-        model.train(events_df)
-        return jsonify({'status': 'switched', 'use_full': USE_FULL_DATASET, 'events_count': len(events_df)})
+        # Reuses cached stages when this dataset was built before; on failure
+        # the current snapshot stays in place
+        snap = build_model('switch_loader', use_full=bool(toggle))
+        return jsonify({'status': 'switched', 'use_full': snap.use_full, 'events_count': events_count()})
     except Exception as e:
-        USE_FULL_DATASET = not USE_FULL_DATASET
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/loader_status')
+@bp.route('/loader_status')
 def loader_status():
     """Return current loader status."""
-    return jsonify({'use_full_dataset': USE_FULL_DATASET, 'events_count': len(events_df)})
+    snap = state
+    return jsonify({'use_full_dataset': snap.use_full, 'events_count': events_count(),
+                    'model_version': snap.version})
+
+def create_app(config=None, warmup=None):
+    """Build the Flask app.
+
+    `warmup` controls when the model is loaded: None defers it to the first
+    request, 'background' starts loading now in a thread, 'sync' blocks until
+    warm. Use 'background' under a WSGI server so /readyz can gate traffic:
+    gunicorn 'app:create_app(warmup="background")'
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('FLASK_SECRET', 'dev-secret')
+    if config:
+        app.config.update(config)
+
+    # Per-route latency, cache, model and DB metrics at /metrics
+    instrument_app(app)
+
+    # Optional request capture for load replay: set REQUEST_LOG_PATH to a .jsonl file
+    request_log_path = os.environ.get('REQUEST_LOG_PATH')
+    if request_log_path:
+        RequestCapture(request_log_path).init_app(app)
+
+    # Opt-in request profiling. Nothing is registered (no per-request cost) unless
+    # PROFILE_SAMPLE_RATE > 0 or PROFILE_HEADER=1 (honours 'X-Profile: 1').
+    profile_sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0)
+    profile_header = os.environ.get('PROFILE_HEADER') == '1'
+    if profile_sample_rate > 0 or profile_header:
+        RequestProfiler(
+            os.environ.get('PROFILE_DIR', os.path.join('models', 'profiles')),
+            sample_rate=profile_sample_rate,
+            allow_header=profile_header,
+            mode=os.environ.get('PROFILE_MODE', 'cprofile'),
+        ).init_app(app)
+
+    app.register_blueprint(bp)
+
+    @app.errorhandler(ShardUnavailable)
+    def shard_unavailable(e):
+        logger.warning('Shard call failed: %s', e)
+        response = jsonify({'error': 'shard_unavailable'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+    if warmup == 'background':
+        start_warmup()
+    elif warmup == 'sync':
+        warm()
+    if warmup is not None:
+        start_prewarmer()
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
-    # Background prewarm scheduler
-    def schedule_prewarm():
-        """Prewarm cache every 24 hours."""
-        import time
-        while True:
-            time.sleep(24 * 3600)
-            try:
-                users = events_df['user_id'].value_counts().nlargest(100).index.tolist()
-                for u in users:
-                    recs = model.recommend(u, top_k=6)
-                    try:
-                        conn = sqlite3.connect(DB_PATH)
-                        c = conn.cursor()
-                        c.execute('REPLACE INTO rec_cache (user_id, top_k, recs, ts) VALUES (?,?,?,?)',
-                                  (int(u), int(6), json.dumps(recs), time.time()))
-                        conn.commit()
-                        conn.close()
-                    except Exception:
-                        pass
-                print('Background prewarm completed')
-            except Exception as e:
-                print('Background prewarm failed:', e)
-    
-    # Start background thread (daemon so it doesn't block shutdown)
-    prewarm_thread = threading.Thread(target=schedule_prewarm, daemon=True)
-    prewarm_thread.start()
-    
-    app.run(debug=True)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    debug = os.environ.get('FLASK_DEBUG', '1') != '0'
+    # With the debug reloader, only the serving child process loads the model;
+    # warm before binding so the server accepts traffic only once ready.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not debug:
+        warm()
+    # Keep the cache warm for the users who actually request recommendations
+    start_prewarmer()
+
+    app.run(debug=debug)
\ No newline at end of file
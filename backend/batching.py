@@ -0,0 +1,104 @@
+# backend/batching.py
+# Micro-batching: concurrent requests for the same kind of work are coalesced
+# into one batch call (e.g. one recommend_batch matrix pass for many users),
+# and each caller gets its own slice of the result.
+import threading
+import time
+
+from backend.instrumentation import BATCH_SIZE, BATCH_WAIT
+
+
+class _Batch:
+    __slots__ = ('context', 'items', 'enqueued', 'full', 'done', 'results', 'error')
+
+    def __init__(self, context):
+        self.context = context
+        self.items = []
+        self.enqueued = []
+        self.full = False
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class Coalescer:
+    """Group concurrent `submit` calls into batches scored by `score(context, items)`.
+
+    `score` returns {item: result}. Calls with the same `key` share a batch
+    (and the `context` of the first one, e.g. the model to score with). The
+    first caller of a batch leads it: it waits up to `max_wait` seconds for
+    others to join (less if the batch reaches `max_batch`), then scores the
+    batch on its own thread while the others wait for their result.
+
+    A leader only waits while another batch is being scored, and stops
+    waiting as soon as none is, so a lone request pays no extra latency;
+    under load, requests that arrive while a batch runs are collected into
+    the next one. `max_wait=0` disables batching (every call is scored on
+    its own).
+    """
+
+    def __init__(self, score, max_batch=32, max_wait=0.002, name='default'):
+        self.score = score
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.name = name
+        self._open = {}
+        self._running = 0
+        self._lock = threading.Lock()
+        # Notified when a batch fills up or a running batch finishes
+        self._changed = threading.Condition(self._lock)
+
+    def submit(self, key, item, context=None):
+        """Score `item` (possibly together with concurrent calls); returns its result."""
+        if self.max_wait <= 0:
+            BATCH_SIZE.observe(1, batcher=self.name)
+            return self.score(context, [item])[item]
+        now = time.perf_counter()
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch(context)
+                self._open[key] = batch
+            batch.items.append(item)
+            batch.enqueued.append(now)
+            if len(batch.items) >= self.max_batch:
+                # Closed: later calls start a new batch
+                del self._open[key]
+                batch.full = True
+                self._changed.notify_all()
+            if leader:
+                deadline = now + self.max_wait
+                while self._running > 0 and not batch.full:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                self._running += 1
+        if leader:
+            try:
+                self._run(batch)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._changed.notify_all()
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[item]
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        for enqueued in batch.enqueued:
+            BATCH_WAIT.observe(started - enqueued, batcher=self.name)
+        items = list(dict.fromkeys(batch.items))
+        BATCH_SIZE.observe(len(items), batcher=self.name)
+        try:
+            batch.results = self.score(batch.context, items)
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
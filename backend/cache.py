@@ -0,0 +1,115 @@
+# backend/cache.py
+# Thread-safe LRU map with lock striping: keys hash to one of N independently
+# locked segments, so concurrent requests for different users rarely contend.
+import threading
+from collections import OrderedDict
+
+
+class StripedLRU:
+    """Bounded LRU mapping split into `stripes` segments, each with its own lock.
+
+    Eviction is per segment (each holds at most ceil(max_entries / stripes)
+    keys), which approximates a global LRU closely when keys hash evenly.
+    With `max_bytes` and a `sizeof(key, value)` estimate, each segment also
+    keeps its entries under its share of that budget.
+    Every operation locks a single segment, except `clear`, `discard_where`,
+    `__len__` and `nbytes`, which visit them one at a time.
+    """
+
+    def __init__(self, max_entries, stripes=16, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.stripes = max(1, stripes)
+        self._per_stripe = max(1, -(-max_entries // self.stripes))
+        self._segments = [OrderedDict() for _ in range(self.stripes)]
+        self._locks = [threading.Lock() for _ in range(self.stripes)]
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof if max_bytes is not None else None
+        self._bytes_per_stripe = None if max_bytes is None else max_bytes / self.stripes
+        # Per segment: key -> estimated size, and their total
+        self._sizes = [{} for _ in range(self.stripes)]
+        self._used = [0] * self.stripes
+
+    def _index(self, key):
+        return hash(key) % self.stripes
+
+    def get(self, key, default=None):
+        """Return the value for `key` and mark it most recently used."""
+        i = self._index(key)
+        with self._locks[i]:
+            segment = self._segments[i]
+            if key not in segment:
+                return default
+            segment.move_to_end(key)
+            return segment[key]
+
+    def set(self, key, value):
+        i = self._index(key)
+        with self._locks[i]:
+            segment = self._segments[i]
+            segment[key] = value
+            segment.move_to_end(key)
+            if self._sizeof is not None:
+                sizes = self._sizes[i]
+                size = self._sizeof(key, value)
+                self._used[i] += size - sizes.get(key, 0)
+                sizes[key] = size
+            while len(segment) > self._per_stripe or (
+                    self._sizeof is not None and self._used[i] > self._bytes_per_stripe and len(segment) > 1):
+                old, _ = segment.popitem(last=False)
+                self._forget(i, old)
+
+    def _forget(self, i, key):
+        if self._sizeof is not None:
+            self._used[i] -= self._sizes[i].pop(key, 0)
+
+    def pop(self, key, default=None):
+        i = self._index(key)
+        with self._locks[i]:
+            self._forget(i, key)
+            return self._segments[i].pop(key, default)
+
+    def __contains__(self, key):
+        i = self._index(key)
+        with self._locks[i]:
+            return key in self._segments[i]
+
+    def __len__(self):
+        total = 0
+        for lock, segment in zip(self._locks, self._segments):
+            with lock:
+                total += len(segment)
+        return total
+
+    def nbytes(self):
+        """Estimated size of the entries (0 without `max_bytes`)."""
+        total = 0
+        for i, lock in enumerate(self._locks):
+            with lock:
+                total += self._used[i]
+        return total
+
+    def clear(self):
+        for i, (lock, segment) in enumerate(zip(self._locks, self._segments)):
+            with lock:
+                segment.clear()
+                self._sizes[i].clear()
+                self._used[i] = 0
+
+    def discard_where(self, predicate):
+        """Remove every key for which `predicate(key)` is true; returns how many."""
+        removed = 0
+        for i, (lock, segment) in enumerate(zip(self._locks, self._segments)):
+            with lock:
+                for key in [k for k in segment if predicate(k)]:
+                    del segment[key]
+                    self._forget(i, key)
+                    removed += 1
+        return removed
+
+    def keys(self):
+        """Snapshot of the keys (in no particular order)."""
+        out = []
+        for lock, segment in zip(self._locks, self._segments):
+            with lock:
+                out.extend(segment)
+        return out
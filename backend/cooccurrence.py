@@ -0,0 +1,174 @@
+# backend/cooccurrence.py
+# "Viewed/bought together" item-to-item signal built in one streaming pass over
+# events, with bounded memory (space-saving top-N counters per item).
+import os
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+RAW_PATH = "data/raw/"
+EVENT_COLUMNS = {"visitorid": "user_id", "itemid": "product_id", "event": "interaction_type"}
+
+
+class SpaceSaving:
+    """Approximate top-N heavy hitters in `capacity` slots (Metwally et al.).
+
+    When full, a new key replaces the current minimum and inherits its count,
+    so heavy keys are never undercounted and memory never grows.
+    """
+
+    __slots__ = ('capacity', 'counts')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, key, weight=1.0):
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+        elif len(counts) < self.capacity:
+            counts[key] = weight
+        else:
+            victim = min(counts, key=counts.get)
+            counts[key] = counts.pop(victim) + weight
+
+    def top(self, n=None):
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+        return ranked if n is None else ranked[:n]
+
+
+class CooccurrenceBuilder:
+    """Accumulate item pairs seen together, one event at a time.
+
+    Two items co-occur when the same visitor touches both within `window_s`
+    seconds, or when both are in the same `transactionid`. Each event is
+    compared with the visitor's last `history` events in the order they were
+    fed, so pairs are exact only when each visitor's events arrive in time
+    order. `update` sorts every chunk by (visitor, timestamp), since
+    events.csv is not in time order; events of one visitor split across
+    chunks can still miss partners that were pushed out of a full history.
+
+    Per-visitor and per-transaction state live in LRU maps capped at
+    `max_visitors` / `max_transactions`, and each item keeps only `per_item`
+    neighbour counters, so memory is bounded regardless of how long the event
+    history is.
+    """
+
+    def __init__(self, window_s=1800, per_item=50, history=20, max_visitors=200000,
+                 max_transactions=100000, view_weight=1.0, transaction_weight=3.0):
+        self.window_ms = window_s * 1000
+        self.per_item = per_item
+        self.history = history
+        self.max_visitors = max_visitors
+        self.max_transactions = max_transactions
+        self.view_weight = view_weight
+        self.transaction_weight = transaction_weight
+        self.counters = {}
+        self._visitors = OrderedDict()
+        self._transactions = OrderedDict()
+        self.events_seen = 0
+
+    def _pair(self, a, b, weight):
+        counters = self.counters
+        ca = counters.get(a)
+        if ca is None:
+            ca = counters[a] = SpaceSaving(self.per_item)
+        ca.add(b, weight)
+        cb = counters.get(b)
+        if cb is None:
+            cb = counters[b] = SpaceSaving(self.per_item)
+        cb.add(a, weight)
+
+    def add(self, ts, visitor, item, transaction=None):
+        """Feed one event (timestamp in ms)."""
+        self.events_seen += 1
+        visitors = self._visitors
+        hist = visitors.get(visitor)
+        if hist is None:
+            hist = visitors[visitor] = deque(maxlen=self.history)
+            if len(visitors) > self.max_visitors:
+                visitors.popitem(last=False)
+        else:
+            visitors.move_to_end(visitor)
+        for prev_ts, prev_item in hist:
+            if prev_item != item and abs(ts - prev_ts) <= self.window_ms:
+                self._pair(item, prev_item, self.view_weight)
+        hist.append((ts, item))
+
+        if transaction is not None:
+            txs = self._transactions
+            basket = txs.get(transaction)
+            if basket is None:
+                basket = txs[transaction] = []
+                if len(txs) > self.max_transactions:
+                    txs.popitem(last=False)
+            if item not in basket:
+                for other in basket:
+                    self._pair(item, other, self.transaction_weight)
+                basket.append(item)
+
+    def update(self, chunk):
+        """Feed a chunk of events with timestamp/user_id/product_id[/transactionid] columns.
+
+        The chunk is fed in (user_id, timestamp) order; events.csv is not in
+        time order.
+        """
+        chunk = chunk.sort_values(['user_id', 'timestamp'], kind='stable')
+        ts = chunk['timestamp'].to_numpy()
+        users = chunk['user_id'].to_numpy()
+        items = chunk['product_id'].to_numpy()
+        if 'transactionid' in chunk.columns:
+            tx = chunk['transactionid'].to_numpy()
+        else:
+            tx = np.full(len(chunk), np.nan)
+        add = self.add
+        for t, u, i, x in zip(ts.tolist(), users.tolist(), items.tolist(), tx.tolist()):
+            # Missing transaction ids come through as NaN
+            add(t, u, i, None if x is None or x != x else x)
+        return self
+
+    def build(self, top_n=20):
+        """Return compact arrays: neighbour lists per item in CSR form, with
+        scores normalised to [0, 1] per item."""
+        keys = sorted(self.counters)
+        indptr = [0]
+        neighbors = []
+        scores = []
+        for key in keys:
+            top = self.counters[key].top(top_n)
+            best = top[0][1] if top else 1.0
+            for other, count in top:
+                neighbors.append(other)
+                scores.append(count / best)
+            indptr.append(len(neighbors))
+        return {
+            'cooc_items': np.asarray(keys, dtype=np.int64),
+            'cooc_indptr': np.asarray(indptr, dtype=np.int64),
+            'cooc_neighbors': np.asarray(neighbors, dtype=np.int64),
+            'cooc_scores': np.asarray(scores, dtype=np.float32),
+        }
+
+
+def iter_event_chunks(path=None, chunksize=500000):
+    """Stream events.csv in chunks with the loader's column names."""
+    path = path or os.path.join(RAW_PATH, "events.csv")
+    for chunk in pd.read_csv(path, chunksize=chunksize,
+                             usecols=["timestamp", "visitorid", "itemid", "event", "transactionid"]):
+        yield chunk.rename(columns=EVENT_COLUMNS)
+
+
+def build_cooccurrence(source=None, top_n=20, chunksize=500000, **params):
+    """One streaming pass over `source` (a CSV path, a DataFrame, an iterable
+    of DataFrame chunks, or None for data/raw/events.csv)."""
+    builder = CooccurrenceBuilder(**params)
+    if source is None or isinstance(source, (str, os.PathLike)):
+        chunks = iter_event_chunks(source, chunksize=chunksize)
+    elif isinstance(source, pd.DataFrame):
+        chunks = [source]
+    else:
+        chunks = source
+    for chunk in chunks:
+        builder.update(chunk)
+    return builder.build(top_n=top_n)
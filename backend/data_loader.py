@@ -1,8 +1,17 @@
 import pandas as pd
+import numpy as np
 import os
 
 RAW_PATH = "data/raw/"
 
+EVENT_WEIGHTS = {"view": 1, "addtocart": 3, "transaction": 5}
+
+# Rows per chunk for the streaming reader
+CHUNK_ROWS = 1_000_000
+# Same categories in every chunk, so concatenated chunks stay categorical
+EVENT_DTYPE = pd.CategoricalDtype(list(EVENT_WEIGHTS))
+_WEIGHT_BY_CODE = np.array(list(EVENT_WEIGHTS.values()), dtype=np.int64)
+
 def load_events():
     events_path = os.path.join(RAW_PATH, "events.csv")
     df = pd.read_csv(events_path)
@@ -13,10 +22,160 @@ def load_events():
         "event": "interaction_type"
     })
     # Optional: map event_type to weights
-    event_weights = {"view": 1, "addtocart": 3, "transaction": 5}
-    df["weight"] = df["interaction_type"].map(event_weights)
+    df["weight"] = df["interaction_type"].map(EVENT_WEIGHTS)
     return df
 
+
+class _Counts:
+    """Event counts per id as two sorted arrays (12 bytes per distinct id,
+    instead of a dict entry per id)."""
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int32)
+
+    def add(self, values):
+        keys, counts = np.unique(values, return_counts=True)
+        pos = np.searchsorted(self.keys, keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+        self.counts[pos[found]] += counts[found].astype(np.int32)
+        if not found.all():
+            new = ~found
+            self.keys = np.insert(self.keys, pos[new], keys[new])
+            self.counts = np.insert(self.counts, pos[new], counts[new].astype(np.int32))
+
+    def select(self, top=None, min_count=1):
+        """Sorted ids with at least `min_count` events, limited to the `top`
+        most frequent (ties go to the smaller id)."""
+        keep = self.counts >= min_count
+        keys, counts = self.keys[keep], self.counts[keep]
+        if top is not None and len(keys) > top:
+            keys = np.sort(keys[np.lexsort((keys, -counts))[:top]])
+        return keys
+
+
+def _id_dtype(ids):
+    return np.int32 if len(ids) == 0 or (ids.min() >= np.iinfo(np.int32).min and ids.max() <= np.iinfo(np.int32).max) else np.int64
+
+
+class EventStream:
+    """Filter events.csv in two chunked passes, with memory bounded by the output.
+
+    - Pass 1 (`scan()`, run on first use) reads `timestamp`, `visitorid` and
+      `itemid` chunk by chunk and keeps only per-id event counts, then picks
+      the users and items that pass the filters.
+    - Pass 2 (each iteration) reads the file again and yields typed chunks
+      (user_id, product_id, interaction_type, weight, timestamp) holding only
+      the rows of selected users and items.
+
+    Filters: `max_users` / `max_items` keep the most active ids (by event
+    count in the time range); `min_user_events` / `min_item_events` drop rare
+    ones; `start` / `end` restrict timestamps (epoch ms, end exclusive);
+    `nrows` reads only the head of the file. Users and items are selected
+    independently, like `sample_data_loader.load_events`. Rows with unknown
+    event types are skipped.
+
+    Chunks can be fed to `sample_recommender.build_user_item_matrix` (or
+    `RecommenderSystem.train`) directly; `newest` (the latest timestamp in
+    the time range, known after pass 1) is the reference time for
+    time-decayed weights.
+    """
+
+    def __init__(self, path=None, max_users=None, max_items=None, min_user_events=1, min_item_events=1,
+                 start=None, end=None, nrows=None, chunksize=CHUNK_ROWS):
+        self.path = path or os.path.join(RAW_PATH, "events.csv")
+        self.max_users = max_users
+        self.max_items = max_items
+        self.min_user_events = min_user_events
+        self.min_item_events = min_item_events
+        self.start = start
+        self.end = end
+        self.nrows = nrows
+        self.chunksize = chunksize
+        self.users = None
+        self.items = None
+        self._newest = None
+        self.rows_scanned = 0
+        self.rows_selected = 0
+
+    def _chunks(self):
+        """Raw chunks of known events within the time range (transactionid is not read)."""
+        reader = pd.read_csv(
+            self.path, usecols=["timestamp", "visitorid", "itemid", "event"],
+            dtype={"timestamp": np.int64, "visitorid": np.int64, "itemid": np.int64, "event": EVENT_DTYPE},
+            chunksize=self.chunksize, nrows=self.nrows,
+        )
+        for chunk in reader:
+            # Unknown event types parse as NaN categories
+            keep = chunk["event"].notna().to_numpy()
+            ts = chunk["timestamp"].to_numpy()
+            if self.start is not None:
+                keep = keep & (ts >= self.start)
+            if self.end is not None:
+                keep = keep & (ts < self.end)
+            yield chunk if keep.all() else chunk[keep]
+
+    def scan(self):
+        """Pass 1: count events per user and item and select the ids to keep."""
+        user_counts, item_counts = _Counts(), _Counts()
+        self.rows_scanned = 0
+        newest = None
+        for chunk in self._chunks():
+            if chunk.empty:
+                continue
+            self.rows_scanned += len(chunk)
+            user_counts.add(chunk["visitorid"].to_numpy())
+            item_counts.add(chunk["itemid"].to_numpy())
+            chunk_newest = int(chunk["timestamp"].max())
+            newest = chunk_newest if newest is None else max(newest, chunk_newest)
+        self._newest = newest
+        self.users = user_counts.select(self.max_users, self.min_user_events)
+        self.items = item_counts.select(self.max_items, self.min_item_events)
+        return self
+
+    @property
+    def newest(self):
+        if self.users is None:
+            self.scan()
+        return self._newest
+
+    def __iter__(self):
+        """Pass 2: yield the selected rows chunk by chunk."""
+        if self.users is None:
+            self.scan()
+        user_dtype, item_dtype = _id_dtype(self.users), _id_dtype(self.items)
+        selected = 0
+        for chunk in self._chunks():
+            users = chunk["visitorid"].to_numpy()
+            items = chunk["itemid"].to_numpy()
+            keep = np.isin(users, self.users) & np.isin(items, self.items)
+            if not keep.any():
+                continue
+            codes = chunk["event"].cat.codes.to_numpy()[keep]
+            out = pd.DataFrame({
+                "user_id": users[keep].astype(user_dtype),
+                "product_id": items[keep].astype(item_dtype),
+                "interaction_type": pd.Categorical.from_codes(codes, dtype=EVENT_DTYPE),
+                "timestamp": chunk["timestamp"].to_numpy()[keep],
+                "weight": _WEIGHT_BY_CODE[codes],
+            })
+            selected += len(out)
+            yield out
+        self.rows_selected = selected
+
+
+def load_events_filtered(**filters):
+    """Events that pass the `EventStream` filters, as one frame (see EventStream)."""
+    chunks = list(EventStream(**filters))
+    if not chunks:
+        return pd.DataFrame({
+            "user_id": pd.Series(dtype=np.int32), "product_id": pd.Series(dtype=np.int32),
+            "interaction_type": pd.Series(dtype=EVENT_DTYPE), "timestamp": pd.Series(dtype=np.int64),
+            "weight": pd.Series(dtype=np.int64),
+        })
+    return pd.concat(chunks, ignore_index=True)
+
 def load_items():
     items_path = os.path.join(RAW_PATH, "item_properties_part1.csv")
     df1 = pd.read_csv(items_path)
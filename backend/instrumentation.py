@@ -0,0 +1,205 @@
+# backend/instrumentation.py
+# Low-overhead counters and histograms exposed in Prometheus text format.
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds (0.5ms .. 30s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return float(ordered[min(rank, len(ordered)) - 1])
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {v}' for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (set directly)."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by label values."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        series = self._series.get(key)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", repr(bound)))} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", "+Inf"))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Metrics shared by the app, the model wrappers and background jobs
+HTTP_REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP requests by route, method and status.',
+                                 ('route', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('http_request_duration_seconds', 'HTTP request latency by route.',
+                                  ('route', 'method'))
+REC_CACHE = REGISTRY.counter('rec_cache_requests_total', 'Recommendation cache lookups by tier and result.',
+                             ('tier', 'result'))
+MODEL_LATENCY = REGISTRY.histogram('model_call_duration_seconds', 'Time spent in model scoring calls.',
+                                   ('method',))
+ENRICH_LATENCY = REGISTRY.histogram('item_enrichment_duration_seconds',
+                                    'Time spent loading item details for a response.', ('stage',))
+DB_LATENCY = REGISTRY.histogram('db_operation_duration_seconds', 'SQLite cache reads and writes.', ('op',))
+DB_ERRORS = REGISTRY.counter('db_errors_total', 'Failed SQLite cache operations.', ('op',))
+TRAIN_LATENCY = REGISTRY.histogram('model_train_duration_seconds', 'Model training runs.', ('reason',),
+                                   buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, 10800))
+PREWARM_USERS = REGISTRY.counter('prewarm_users_total', 'Users whose recommendations were prewarmed.', ('source',))
+PREWARM_HOT_USERS = REGISTRY.gauge('prewarm_hot_users', 'Users in the predicted hot set at the last prewarm cycle.')
+PREWARM_CPU = REGISTRY.counter('prewarm_cpu_seconds_total', 'CPU time spent scoring prewarm batches.')
+BATCH_SIZE = REGISTRY.histogram('batch_size', 'Distinct items per coalesced model call.', ('batcher',),
+                                buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BATCH_WAIT = REGISTRY.histogram('batch_queue_wait_seconds', 'Time a request waited for its batch to start.',
+                                ('batcher',),
+                                buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def instrument_app(app, registry=REGISTRY):
+    """Time every request by route template and expose `/metrics`."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method)
+            HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,284 @@
+# backend/pipeline.py
+# Staged, content-addressed model build:
+#   ingest -> matrix -> similarities -> popularity -> artifact  (+ cooccurrence)
+# Every stage output is cached on disk under a key hashed from its parameters
+# and its inputs' keys (the raw files are keyed by content), so an unchanged
+# dataset loads the finished artifact without touching any earlier stage and a
+# change rebuilds only the stages downstream of it.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+# Bump a stage's version when its code changes so old cache entries stop matching
+STAGE_VERSIONS = {
+    'ingest': 3,
+    'matrix': 1,
+    'similarities': 1,
+    'cooccurrence': 2,
+    'popularity': 1,
+    'artifact': 2,
+}
+
+# Loader defaults used by app.py (sample_data_loader.load_events)
+DEFAULT_LOADER_PARAMS = {'sample_frac': 0.01, 'max_users': 100, 'max_items': 100, 'nrows': 50000}
+
+# Length of the ranked user/item lists kept by the popularity stage
+POPULAR_MAX = 10000
+
+_fingerprint_lock = threading.Lock()
+
+
+def _hash(payload):
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:24]
+
+
+def file_digest(path, cache_path=None):
+    """sha256 of a file's content.
+
+    With `cache_path`, digests are remembered per (size, mtime) so an
+    untouched multi-GB file is not re-read on every start.
+    """
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    key = os.path.abspath(path)
+    cache = {}
+    if cache_path:
+        with _fingerprint_lock:
+            try:
+                with open(cache_path, encoding='utf-8') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+        entry = cache.get(key)
+        if entry and entry.get('stamp') == stamp:
+            return entry['sha256']
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+
+    if cache_path:
+        with _fingerprint_lock:
+            cache[key] = {'stamp': stamp, 'sha256': digest}
+            tmp = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(tmp, cache_path)
+    return digest
+
+
+def _events_path(loader):
+    if loader == 'full':
+        import backend.data_loader as module
+    else:
+        import sample_data_loader as module
+    return os.path.join(module.RAW_PATH, 'events.csv')
+
+
+class TrainingPipeline:
+    """Build (or load) a RecommenderSystem through cached stages.
+
+    - `loader`: 'sample' (sample_data_loader with `loader_params`) or 'full'
+      (streamed from the whole events.csv by backend.data_loader.EventStream;
+      `loader_params` are its filters, none by default).
+    - `cooc_params`: keyword arguments for `backend.cooccurrence.build_cooccurrence`,
+      or None to skip the co-occurrence stage.
+    - `weighting`: optional {'half_life': seconds, 'window': seconds} for
+      time-decayed, windowed interaction weights (relative to the newest
+      event; see `sample_recommender.time_weighted`). Only the matrix stage
+      and later depend on it.
+    - Precision is applied in the artifact stage only, so switching
+      MODEL_PRECISION reuses the float64 similarities.
+
+    After `build()`, `report` maps each stage that was needed to 'cached' or
+    'built' (with timings in `timings`).
+    """
+
+    def __init__(self, cache_dir, loader='sample', loader_params=None, precision='float64',
+                 cooc_params=None, weighting=None, keep=3, rebuild=False):
+        self.cache_dir = cache_dir
+        self.loader = loader
+        self.loader_params = dict(DEFAULT_LOADER_PARAMS if loader_params is None else loader_params)
+        if loader == 'full':
+            self.loader_params = {k: v for k, v in (loader_params or {}).items() if v is not None}
+        self.precision = precision
+        self.cooc_params = None if cooc_params is None else dict(cooc_params)
+        self.weighting = {k: v for k, v in (weighting or {}).items() if v is not None}
+        self.keep = keep
+        # Ignore existing cache entries (they are overwritten)
+        self.rebuild = rebuild
+        self.report = {}
+        self.timings = {}
+        self._keys = {}
+        self._values = {}
+
+    # -- keys -----------------------------------------------------------------
+
+    def _raw_digest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return file_digest(_events_path(self.loader), os.path.join(self.cache_dir, 'fingerprints.json'))
+
+    def _spec(self, stage):
+        """(parameters, input stages) that determine a stage's output."""
+        if stage == 'ingest':
+            return {'loader': self.loader, 'params': self.loader_params, 'events': self._raw_digest()}, ()
+        if stage == 'matrix':
+            # Static weights keep the key they had before weighting existed
+            return ({'weighting': self.weighting} if self.weighting else {}), ('ingest',)
+        if stage == 'popularity':
+            return {}, ('ingest',)
+        if stage == 'similarities':
+            return {}, ('matrix',)
+        if stage == 'cooccurrence':
+            # Built from the complete raw events file, whichever loader is used
+            return {'params': self.cooc_params, 'events': self._raw_digest()}, ()
+        if stage == 'artifact':
+            inputs = ('matrix', 'similarities') + (('cooccurrence',) if self.cooc_params is not None else ())
+            return {'precision': self.precision}, inputs
+        raise KeyError(stage)
+
+    def key(self, stage):
+        """Content key of a stage: computed from hashes only, nothing is loaded."""
+        if stage not in self._keys:
+            params, inputs = self._spec(stage)
+            self._keys[stage] = _hash({
+                'stage': stage,
+                'version': STAGE_VERSIONS[stage],
+                'params': params,
+                'inputs': {name: self.key(name) for name in inputs},
+            })
+        return self._keys[stage]
+
+    def path(self, stage):
+        return os.path.join(self.cache_dir, stage, f'{self.key(stage)}.joblib')
+
+    # -- stages ---------------------------------------------------------------
+
+    def get(self, stage):
+        """Return a stage's output, loading it from the cache or building it."""
+        if stage in self._values:
+            return self._values[stage]
+        path = self.path(stage)
+        started = time.perf_counter()
+        value = None
+        if not self.rebuild and os.path.exists(path):
+            try:
+                value = self._load(stage, path)
+                self.report[stage] = 'cached'
+                # Mark as recently used so _prune keeps entries still in use
+                os.utime(path)
+            except Exception:
+                logger.warning('Discarding unreadable %s cache entry %s', stage, path)
+                value = None
+        if value is None:
+            value = self._build(stage)
+            self._store(stage, path, value)
+            self.report[stage] = 'built'
+        self.timings[stage] = time.perf_counter() - started
+        self._values[stage] = value
+        return value
+
+    def _build(self, stage):
+        if stage == 'ingest':
+            if self.loader == 'full':
+                # Two chunked passes; memory follows the filtered output, not the file
+                from backend.data_loader import load_events_filtered
+                return load_events_filtered(**self.loader_params)
+            from sample_data_loader import load_events
+            return load_events(**self.loader_params)
+        if stage == 'matrix':
+            from sample_recommender import build_user_item_matrix
+            return build_user_item_matrix(self.get('ingest'), **self.weighting)
+        if stage == 'similarities':
+            from sample_recommender import build_similarities
+            user_sim, item_sim = build_similarities(self.get('matrix'))
+            return {'user_sim': user_sim, 'item_sim': item_sim}
+        if stage == 'cooccurrence':
+            from backend.cooccurrence import build_cooccurrence
+            return build_cooccurrence(_events_path(self.loader), **self.cooc_params)
+        if stage == 'popularity':
+            events = self.get('ingest')
+            return {
+                'top_users': events['user_id'].value_counts().index[:POPULAR_MAX].tolist(),
+                'top_items': events.groupby('product_id')['weight'].sum()
+                                   .sort_values(ascending=False).index[:POPULAR_MAX].tolist(),
+                'demo_users': events['user_id'].unique()[:10].tolist(),
+                'events_count': int(len(events)),
+            }
+        if stage == 'artifact':
+            from sample_recommender import RecommenderSystem
+            sims = self.get('similarities')
+            model = RecommenderSystem(precision=self.precision)
+            model.assemble(self.get('matrix'), sims['user_sim'], sims['item_sim'])
+            if self.cooc_params is not None:
+                model.set_cooccurrence(self.get('cooccurrence'))
+            return model
+        raise KeyError(stage)
+
+    def _load(self, stage, path):
+        if stage == 'artifact':
+            from sample_recommender import RecommenderSystem
+            model = RecommenderSystem(precision=self.precision)
+            model.load(path)
+            return model
+        return joblib.load(path)
+
+    def _store(self, stage, path, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        if stage == 'artifact':
+            value.save(tmp)
+            value.model_path = path
+        else:
+            joblib.dump(value, tmp)
+        os.replace(tmp, path)
+        self._prune(stage)
+
+    def _prune(self, stage):
+        """Keep the `keep` most recently built or loaded entries of a stage (by mtime)."""
+        stage_dir = os.path.join(self.cache_dir, stage)
+        entries = sorted((os.path.join(stage_dir, name) for name in os.listdir(stage_dir)
+                          if name.endswith('.joblib')), key=os.path.getmtime, reverse=True)
+        for old in entries[self.keep:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    # -- results --------------------------------------------------------------
+
+    def build(self):
+        """Return the trained model, building only the stale stages."""
+        return self.get('artifact')
+
+    def built_anything(self):
+        return any(state == 'built' for state in self.report.values())
+
+    def export(self, target):
+        """Point `target` (e.g. models/sample_model.joblib) at the artifact.
+
+        Uses a hard link where possible (no copy); does nothing when `target`
+        already is this artifact.
+        """
+        source = self.path('artifact')
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return target
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        tmp = f'{target}.{os.getpid()}.tmp'
+        try:
+            os.link(source, tmp)
+        except OSError:
+            import shutil
+            shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+        return target
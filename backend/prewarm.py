@@ -0,0 +1,203 @@
+# backend/prewarm.py
+# Demand-driven cache prewarming: track who actually asks for recommendations
+# with a decayed count-min sketch, and keep the predicted hot set warm in
+# batches under a CPU budget.
+import logging
+import threading
+import time
+
+import numpy as np
+
+from backend.instrumentation import PREWARM_USERS, PREWARM_HOT_USERS, PREWARM_CPU
+
+logger = logging.getLogger(__name__)
+
+
+class DecayedCountMin:
+    """Count-min sketch whose counts decay exponentially with `half_life` seconds.
+
+    Uses forward decay: an event at time t adds `2 ** ((t - t0) / half_life)`,
+    and estimates are scaled back by the same factor at read time, so adding
+    is O(depth) with no per-key timestamps. Counters are rescaled before the
+    factor grows large. Estimates never undercount (beyond decay).
+    """
+
+    def __init__(self, width=4096, depth=4, half_life=3600.0):
+        self.width = width
+        self.depth = depth
+        self.half_life = float(half_life)
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self.t0 = time.time()
+        self._rows = np.arange(depth)
+
+    def _cols(self, key):
+        return np.fromiter((hash((i, key)) % self.width for i in range(self.depth)),
+                           dtype=np.int64, count=self.depth)
+
+    def _factor(self, now):
+        return 2.0 ** ((now - self.t0) / self.half_life)
+
+    def add(self, key, weight=1.0, now=None):
+        now = time.time() if now is None else now
+        factor = self._factor(now)
+        if factor > 1e12:
+            self.table /= factor
+            self.t0 = now
+            factor = 1.0
+        self.table[self._rows, self._cols(key)] += weight * factor
+
+    def estimate(self, key, now=None):
+        now = time.time() if now is None else now
+        return float(self.table[self._rows, self._cols(key)].min()) / self._factor(now)
+
+
+class AccessTracker:
+    """Frequency and recency of requests per key (e.g. (user_id, k)).
+
+    Frequencies live in a `DecayedCountMin`; a bounded candidate map keeps
+    each key's last access so the hot set can be enumerated. `compact()` drops
+    the keys with the lowest decayed counts once the map outgrows `capacity`;
+    the prewarm loop calls it, and `record` only falls back to it when the map
+    reaches twice the capacity.
+    """
+
+    def __init__(self, capacity=5000, half_life=3600.0, width=4096, depth=4):
+        self.capacity = capacity
+        self.sketch = DecayedCountMin(width=width, depth=depth, half_life=half_life)
+        self.last_seen = {}
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+
+    def record(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self.sketch.add(key, now=now)
+            self.last_seen[key] = now
+            overflow = len(self.last_seen) > self.capacity * 2
+        if overflow:
+            self.compact(now)
+
+    def _scored(self, now):
+        # Estimates are computed outside the lock so request threads recording
+        # accesses never wait behind a pass over every candidate
+        with self._lock:
+            keys = list(self.last_seen)
+        return [(self.sketch.estimate(k, now), k) for k in keys]
+
+    def compact(self, now=None):
+        """Keep the `capacity` keys with the highest decayed counts; returns how many were dropped."""
+        now = time.time() if now is None else now
+        if len(self.last_seen) <= self.capacity or not self._compacting.acquire(blocking=False):
+            return 0
+        try:
+            scored = self._scored(now)
+            scored.sort(key=lambda sk: sk[0], reverse=True)
+            with self._lock:
+                for _, key in scored[self.capacity:]:
+                    self.last_seen.pop(key, None)
+            return max(0, len(scored) - self.capacity)
+        finally:
+            self._compacting.release()
+
+    def hot(self, n, min_score=2.0, now=None):
+        """Up to `n` keys by decayed request count, ignoring keys below `min_score`
+        (by default, keys seen only once recently are not worth warming)."""
+        now = time.time() if now is None else now
+        scored = [(s, k) for s, k in self._scored(now) if s >= min_score]
+        scored.sort(key=lambda sk: sk[0], reverse=True)
+        return [k for _, k in scored[:n]]
+
+    def __len__(self):
+        return len(self.last_seen)
+
+
+class Prewarmer:
+    """Background loop that keeps the hot set of an `AccessTracker` warm.
+
+    - `warm_batch(keys)` scores and caches a batch of keys; `is_cached(key)`
+      says whether a key is still in the cache.
+    - Every `interval` seconds (or right away after `kick()`, e.g. on a model
+      swap), keys in the hot set that are missing from the cache are warmed.
+      The cache has no TTL, so a cached key stays valid until it is evicted or
+      the model changes; neither needs tracking here.
+    - Batches of `batch_size` run back to back only while CPU time spent stays
+      under `cpu_budget` (fraction of one core); otherwise the loop sleeps.
+    """
+
+    def __init__(self, tracker, warm_batch, is_cached, hot_size=100, interval=60.0,
+                 batch_size=32, cpu_budget=0.1, min_score=2.0):
+        self.tracker = tracker
+        self.warm_batch = warm_batch
+        self.is_cached = is_cached
+        self.hot_size = hot_size
+        self.interval = interval
+        self.batch_size = batch_size
+        self.cpu_budget = cpu_budget
+        self.min_score = min_score
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due(self, now=None):
+        """Hot keys missing from the cache, hottest first. Read-only."""
+        hot = self.tracker.hot(self.hot_size, min_score=self.min_score, now=now)
+        return [key for key in hot if not self.is_cached(key)]
+
+    def pending_count(self, now=None):
+        """How many hot keys are due; safe to call from request threads while
+        the loop runs (nothing is modified, the tracker is read under its lock)."""
+        return len(self.due(now))
+
+    def run_once(self, now=None):
+        """Warm every due key within the CPU budget; returns how many were warmed."""
+        now = time.time() if now is None else now
+        self.tracker.compact(now)
+        hot = self.tracker.hot(self.hot_size, min_score=self.min_score, now=now)
+        PREWARM_HOT_USERS.set(len(hot))
+        keys = [key for key in hot if not self.is_cached(key)]
+        warmed = 0
+        for start in range(0, len(keys), self.batch_size):
+            if self._stop.is_set():
+                break
+            batch = keys[start:start + self.batch_size]
+            cpu = time.thread_time()
+            self.warm_batch(batch)
+            used = time.thread_time() - cpu
+            PREWARM_CPU.inc(used)
+            warmed += len(batch)
+            if self.cpu_budget < 1.0 and used > 0:
+                # Idle long enough that this batch is `cpu_budget` of the elapsed time
+                self._stop.wait(used * (1.0 - self.cpu_budget) / self.cpu_budget)
+        if warmed:
+            PREWARM_USERS.inc(warmed, source='demand')
+        return warmed
+
+    def kick(self):
+        """Warm on the next loop iteration (e.g. after the cache was cleared)."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='prewarm', daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Prewarm cycle failed')
@@ -0,0 +1,170 @@
+# backend/profiling.py
+# Opt-in per-request profiling: cProfile (pstats) or a stack sampler (collapsed stacks).
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_HEADER = 'X-Profile'
+
+
+def route_slug(route):
+    """Turn a route template like '/get_recommendations/<int:user_id>' into a file name."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')
+    return slug or 'root'
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's stack every `interval` seconds into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.counts
+
+
+class RequestProfiler:
+    """Profile a sampled fraction of requests and aggregate the results per route.
+
+    - `sample_rate`: fraction of requests profiled (0 disables random sampling)
+    - `allow_header`: also profile any request sent with `X-Profile: 1`
+    - `mode`: 'cprofile' writes `<route>.pstats`, 'sample' writes `<route>.collapsed`
+      (flamegraph.pl / speedscope compatible)
+
+    Only one request is profiled at a time; concurrent candidates are skipped so
+    profilers never nest and the overhead stays bounded.
+    """
+
+    def __init__(self, out_dir, sample_rate=0.0, allow_header=False, mode='cprofile', interval=0.005):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f"unknown profiling mode: {mode}")
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.mode = mode
+        self.interval = interval
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {}      # route -> pstats.Stats
+        self._stacks = {}     # route -> Counter
+        self._requests = Counter()
+        os.makedirs(out_dir, exist_ok=True)
+
+    @property
+    def extension(self):
+        return 'pstats' if self.mode == 'cprofile' else 'collapsed'
+
+    def init_app(self, app):
+        from flask import abort, jsonify, send_file
+
+        app.before_request(self._start)
+        app.teardown_request(self._finish)
+
+        @app.route('/profiles')
+        def list_profiles():
+            with self._lock:
+                routes = dict(self._requests)
+            return jsonify({'mode': self.mode, 'sample_rate': self.sample_rate,
+                            'routes': {r: {'requests': n, 'download': f'/profiles/{route_slug(r)}'}
+                                       for r, n in routes.items()}})
+
+        @app.route('/profiles/<slug>')
+        def download_profile(slug):
+            path = os.path.join(self.out_dir, f'{route_slug(slug)}.{self.extension}')
+            if not os.path.exists(path):
+                abort(404)
+            return send_file(os.path.abspath(path), as_attachment=True,
+                             download_name=os.path.basename(path), max_age=0)
+
+        return self
+
+    def _should_profile(self, request):
+        if self.allow_header and request.headers.get(PROFILE_HEADER) == '1':
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start(self):
+        from flask import g, request
+
+        if request.path.startswith('/profiles') or not self._should_profile(request):
+            return
+        if not self._busy.acquire(blocking=False):
+            return
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) is already active
+                self._busy.release()
+                return
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        g._profiler = profiler
+        g._profile_start = time.perf_counter()
+
+    def _finish(self, exc=None):
+        from flask import g, request
+
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return
+        try:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            if self.mode == 'cprofile':
+                profiler.disable()
+                self._add_pstats(route, profiler)
+            else:
+                self._add_stacks(route, profiler.stop())
+        finally:
+            self._busy.release()
+
+    def _add_pstats(self, route, profiler):
+        with self._lock:
+            self._requests[route] += 1
+            stats = self._stats.get(route)
+            if stats is None:
+                stats = self._stats[route] = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                stats.add(profiler)
+            stats.dump_stats(os.path.join(self.out_dir, f'{route_slug(route)}.pstats'))
+
+    def _add_stacks(self, route, counts):
+        with self._lock:
+            self._requests[route] += 1
+            agg = self._stacks.setdefault(route, Counter())
+            agg.update(counts)
+            path = os.path.join(self.out_dir, f'{route_slug(route)}.collapsed')
+            tmp = path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for stack, n in agg.most_common():
+                    f.write(f'{stack} {n}\n')
+            os.replace(tmp, path)
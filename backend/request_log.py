@@ -0,0 +1,206 @@
+# backend/request_log.py
+# Capture live requests to JSONL and replay them against the app for load testing.
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, request, session
+
+from backend.instrumentation import percentile
+
+# Routes whose traffic is worth replaying (static assets are skipped)
+SKIP_PREFIXES = ('/static/',)
+
+
+class RequestCapture:
+    """Append one JSON line per request: path, params, session id, status and timing."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._record)
+        return self
+
+    def _start(self):
+        g._capture_start = time.perf_counter()
+        # /signout clears the session, so remember which one it belonged to
+        g._capture_sid = session.get('sid')
+
+    def _record(self, response):
+        start = g.pop('_capture_start', None)
+        if start is None or request.path.startswith(SKIP_PREFIXES):
+            return response
+        entry = {
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'query': request.query_string.decode('utf-8', 'replace'),
+            'json': request.get_json(silent=True) if request.is_json else None,
+            'sid': session.get('sid') or g.pop('_capture_sid', None),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - start) * 1000.0, 3),
+            'cache': response.headers.get('X-Cache'),
+        }
+        line = json.dumps(entry) + '\n'
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except Exception:
+            pass
+        return response
+
+
+def load_log(path, limit=None):
+    """Read captured requests, oldest first."""
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    entries.sort(key=lambda e: e.get('ts', 0))
+    if limit:
+        entries = entries[:limit]
+    return entries
+
+
+def group_sessions(entries):
+    """Split entries into units that must run in order on one client.
+
+    Requests that share a session id (signin through signout) stay together so
+    cookies carry over; everything else is its own unit.
+    """
+    sessions = {}
+    units = []
+    for e in entries:
+        sid = e.get('sid')
+        if sid is None:
+            units.append([e])
+            continue
+        if sid not in sessions:
+            sessions[sid] = []
+            units.append(sessions[sid])
+        sessions[sid].append(e)
+    return units
+
+
+class TestClientTarget:
+    """Send requests through a Flask test client (one client per unit)."""
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        return self.app.test_client()
+
+    def send(self, client, e):
+        path = e['path'] + ('?' + e['query'] if e.get('query') else '')
+        res = client.open(path, method=e.get('method', 'GET'), json=e.get('json'))
+        return res.status_code, res.headers.get('X-Cache')
+
+
+class HTTPTarget:
+    """Send requests to a running server (one `requests.Session` per unit)."""
+
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def client(self):
+        import requests
+        return requests.Session()
+
+    def send(self, client, e):
+        url = self.base_url + e['path'] + ('?' + e['query'] if e.get('query') else '')
+        res = client.request(e.get('method', 'GET'), url, json=e.get('json'), timeout=self.timeout)
+        return res.status_code, res.headers.get('X-Cache')
+
+
+class _Pacer:
+    """Hand out send slots so the whole replay runs at a fixed QPS."""
+
+    def __init__(self, qps):
+        self.interval = 1.0 / qps if qps else 0.0
+        self._next = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(self._next, time.perf_counter())
+            self._next = slot + self.interval
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def replay(entries, target, concurrency=8, qps=None, speed=None):
+    """Replay captured entries and return throughput/latency/error/cache stats.
+
+    `concurrency` bounds the number of in-flight units; `qps` (optional) paces
+    individual requests across all workers; `speed` (optional) instead keeps the
+    recorded inter-arrival times, scaled by that factor (2.0 = twice as fast).
+    """
+    units = group_sessions(entries)
+    first_ts = entries[0].get('ts', 0) if entries else 0
+    pacer = _Pacer(qps)
+    lock = threading.Lock()
+    latencies = []
+    stats = {'requests': 0, 'errors': 0, 'client_errors': 0, 'cache_hits': 0, 'cache_lookups': 0}
+
+    def run_unit(unit):
+        client = target.client()
+        for e in unit:
+            if speed:
+                delay = start + (e.get('ts', first_ts) - first_ts) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                pacer.wait()
+            t0 = time.perf_counter()
+            try:
+                status, cache = target.send(client, e)
+            except Exception:
+                status, cache = None, None
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                stats['requests'] += 1
+                latencies.append(elapsed)
+                if status is None or status >= 500:
+                    stats['errors'] += 1
+                elif status >= 400:
+                    stats['client_errors'] += 1
+                if cache:
+                    stats['cache_lookups'] += 1
+                    if cache == 'hit':
+                        stats['cache_hits'] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(run_unit, units))
+    duration = time.perf_counter() - start
+
+    n = stats['requests']
+    return {
+        'requests': n,
+        'sessions': sum(1 for u in units if len(u) > 1),
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(n / duration, 2) if duration else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'error_rate': round(stats['errors'] / n, 4) if n else 0.0,
+        'client_error_rate': round(stats['client_errors'] / n, 4) if n else 0.0,
+        'cache_hit_ratio': round(stats['cache_hits'] / stats['cache_lookups'], 4) if stats['cache_lookups'] else None,
+    }
@@ -0,0 +1,42 @@
+# backend/session_cache.py
+# Canonical fingerprints for session scoring: sessions with the same items and
+# nearly the same relative weights share one cached result, whichever visitor
+# produced them and however long ago their clicks were.
+import math
+import sys
+
+
+def session_fingerprint(weights, tolerance=0.1):
+    """Canonical form of a {item_id: weight} session.
+
+    Items are sorted and each weight is taken relative to the largest, then
+    quantized on a log scale in steps of `1 + tolerance`. Session scores are
+    normalised by the total weight, so only relative weights matter; and a
+    recency decay that scales every item alike leaves them unchanged, so a
+    session that is only re-polled keeps its fingerprint. Returns a tuple of
+    (item_id, level) pairs; `representative_weights` inverts it.
+    """
+    if not weights:
+        return ()
+    top = max(weights.values())
+    step = math.log1p(tolerance)
+    return tuple((item, round(math.log(w / top) / step)) for item, w in sorted(weights.items()))
+
+
+def representative_weights(fingerprint, tolerance=0.1):
+    """Weights every session with this fingerprint is scored with, so a
+    cached result depends only on its key (each within `tolerance` of the
+    session's own relative weights)."""
+    return {item: (1.0 + tolerance) ** level for item, level in fingerprint}
+
+
+def approx_size(obj):
+    """Rough bytes held by a cache key or value (nested tuples/lists of scalars)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size += sum(approx_size(part) for part in obj)
+    return size
+
+
+def entry_size(key, value):
+    return approx_size(key) + approx_size(value)
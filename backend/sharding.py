@@ -0,0 +1,388 @@
+# backend/sharding.py
+# Partition per-user serving state across local processes by a stable hash of
+# the user id. Each shard holds only its users' neighbour lists and the
+# interaction rows those neighbours need, so a shard answers user
+# recommendations on its own; the item-side model (sessions) stays with the app.
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import zlib
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from backend.shared_model import publish, attach, read_manifest, ManifestWatcher
+
+logger = logging.getLogger(__name__)
+
+ITEMS_DIR = 'items'
+# Random per-build key for shard IPC, readable only by the owner
+AUTHKEY_FILE = 'authkey'
+
+
+def shard_authkey(root, create=False):
+    """Key that shard workers and the router authenticate with.
+
+    `multiprocessing.connection` unpickles every message, so whoever passes
+    the handshake can run code in the worker: never use a shared constant.
+    SHARD_AUTHKEY wins when set; otherwise the key is read from
+    `root/authkey`, which `create=True` (build_shards) fills with random
+    bytes, mode 0600.
+    """
+    env = os.environ.get('SHARD_AUTHKEY')
+    if env:
+        return env.encode()
+    path = os.path.join(root, AUTHKEY_FILE)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            raise FileNotFoundError(f'no shard key at {path}; set SHARD_AUTHKEY or run scripts/build_shards.py')
+    os.makedirs(root, exist_ok=True)
+    key = secrets.token_bytes(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def shard_of(user_id, n_shards):
+    """Stable shard index for a user id (same in every process and run)."""
+    return zlib.crc32(int(user_id).to_bytes(8, 'little', signed=True)) % n_shards
+
+
+def partition(user_ids, n_shards):
+    """Group user ids by shard: {shard: [user ids in input order]}."""
+    parts = {}
+    for u in user_ids:
+        parts.setdefault(shard_of(u, n_shards), []).append(u)
+    return parts
+
+
+def shard_dir(root, index):
+    return os.path.join(root, f'shard-{index}')
+
+
+def shard_address(root, index):
+    """Default IPC address of a shard worker: a unix socket under `root`
+    (a named pipe on Windows)."""
+    if sys.platform == 'win32':
+        return rf'\\.\pipe\recsys-{zlib.crc32(os.path.abspath(root).encode())}-{index}'
+    return os.path.join(root, f'shard-{index}.sock')
+
+
+def parse_addresses(value):
+    """'host:port,host:port' or socket paths, comma separated."""
+    out = []
+    for part in filter(None, (p.strip() for p in value.split(','))):
+        host, sep, port = part.rpartition(':')
+        out.append((host, int(port)) if sep and port.isdigit() and os.sep not in part else part)
+    return out
+
+
+class ShardModel:
+    """User-side slice of a RecommenderSystem for the users of one shard.
+
+    For every user it keeps the top `neighbours` similar users (as rows of a
+    local interaction matrix holding just those neighbours and the users
+    themselves), so `recommend` gives the same result as the full model.
+    """
+
+    def __init__(self):
+        self.users = []
+        self.items = []
+        self._index = {}
+        self.nbr_rows = None
+        self.nbr_sims = None
+        self.self_rows = None
+        self.matrix = None
+
+    @classmethod
+    def from_model(cls, model, users, neighbours=20, chunk=256):
+        from sample_recommender import dequantize_rows, top_k_indices
+        index = model.user_item_matrix.index
+        user_idx = index.get_indexer(users)
+        nbr_global, nbr_sims = [], []
+        for start in range(0, len(user_idx), chunk):
+            rows = user_idx[start:start + chunk]
+            sims = dequantize_rows(model.user_sim_matrix, model.user_sim_scales, rows)
+            # Same neighbour selection as RecommenderSystem.recommend
+            top = top_k_indices(sims, neighbours)
+            nbr_global.append(top)
+            nbr_sims.append(np.take_along_axis(sims, top, axis=1))
+        n_nbrs = min(neighbours, len(index))
+        nbr_global = np.concatenate(nbr_global) if nbr_global else np.zeros((0, n_nbrs), np.int64)
+        sims = np.concatenate(nbr_sims) if nbr_sims else np.zeros((0, n_nbrs))
+
+        needed, inverse = np.unique(np.concatenate([nbr_global.ravel(), user_idx]), return_inverse=True)
+        shard = cls()
+        shard.users = list(users)
+        shard.items = list(model.items)
+        shard._index = {u: i for i, u in enumerate(shard.users)}
+        shard.nbr_rows = inverse[:nbr_global.size].reshape(nbr_global.shape).astype(np.int64)
+        shard.nbr_sims = sims
+        shard.self_rows = inverse[nbr_global.size:].astype(np.int64)
+        shard.matrix = dequantize_rows(model.user_item_matrix.values, model.user_item_scales, needed)
+        return shard
+
+    def to_arrays(self):
+        return {
+            'users': np.asarray(self.users, dtype=np.int64),
+            'items': np.asarray(self.items, dtype=np.int64),
+            'nbr_rows': self.nbr_rows,
+            'nbr_sims': self.nbr_sims,
+            'self_rows': self.self_rows,
+            'matrix': self.matrix,
+        }
+
+    def from_arrays(self, arrays):
+        self.users = arrays['users'].tolist()
+        self.items = arrays['items'].tolist()
+        self._index = {u: i for i, u in enumerate(self.users)}
+        self.nbr_rows = arrays['nbr_rows']
+        self.nbr_sims = arrays['nbr_sims']
+        self.self_rows = arrays['self_rows']
+        self.matrix = arrays['matrix']
+
+    def recommend(self, user_id, top_k=5):
+        from sample_recommender import top_k_indices
+        i = self._index.get(user_id)
+        if i is None:
+            return []
+        similarities = self.nbr_sims[i]
+        scores = self.matrix[self.nbr_rows[i]]
+        recommended_scores = np.dot(similarities, scores) / (np.sum(similarities) + 1e-9)
+        recommended_scores[self.matrix[self.self_rows[i]] > 0] = -1
+        top_idx = top_k_indices(recommended_scores, top_k)
+        return [self.items[j] for j in top_idx]
+
+    def recommend_batch(self, user_ids, top_k=5):
+        return {u: self.recommend(u, top_k) for u in user_ids}
+
+
+def build_shards(model, root, n_shards, meta=None, extra_arrays=None, neighbours=20):
+    """Publish `n_shards` user shards plus the item-side model under `root`.
+
+    Each part is published like a shared model (versioned .npy files, atomic
+    manifest), so workers memory-map their shard and pick up new versions.
+    The items part is published last, so a new items version means every
+    shard is already updated. Returns the items manifest.
+    """
+    shard_authkey(root, create=True)
+    parts = partition(model.users, n_shards)
+    for index in range(n_shards):
+        shard = ShardModel.from_model(model, parts.get(index, []), neighbours=neighbours)
+        publish(shard, shard_dir(root, index), meta={'shard': index, 'n_shards': n_shards})
+
+    # Sessions only need the item side; keep the user arrays with zero users
+    items_arrays = model.to_arrays()
+    for key in ('users', 'user_item', 'user_sim', 'user_item_scale', 'user_sim_scale'):
+        if key in items_arrays:
+            value = items_arrays[key]
+            shape = (0, value.shape[1]) if key == 'user_item' else (0,) * value.ndim
+            items_arrays[key] = np.zeros(shape, dtype=value.dtype)
+    items_arrays.update(extra_arrays or {})
+    meta = dict(meta or {}, n_shards=n_shards)
+    return publish(_ArraySet(items_arrays), os.path.join(root, ITEMS_DIR), meta=meta)
+
+
+class _ArraySet:
+    """Adapter so `publish` can write a plain dict of arrays."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def to_arrays(self):
+        return self.arrays
+
+
+class ShardServer:
+    """Answer requests for one shard over `multiprocessing.connection`.
+
+    Requests are `(op, args)` tuples; replies are `('ok', result)` or
+    `('error', message)`. Ops: 'recommend_batch' (user_ids, top_k) and 'ping'.
+    A newly published shard version is attached on the next request.
+    """
+
+    def __init__(self, root, index, address=None, authkey=None):
+        self.root = shard_dir(root, index)
+        self.index = index
+        self.address = address or shard_address(root, index)
+        self.authkey = authkey or shard_authkey(root)
+        self.model, _, manifest = attach(self.root, ShardModel)
+        self.version = manifest['version']
+        self._watcher = ManifestWatcher(self.root, version=self.version)
+        self._listener = None
+
+    def _maybe_reload(self):
+        manifest = self._watcher.poll()
+        if manifest is not None:
+            try:
+                self.model, _, _ = attach(self.root, ShardModel, manifest)
+                self.version = manifest['version']
+                logger.info('Shard %s attached version %s', self.index, self.version)
+            except Exception:
+                logger.exception('Shard %s failed to attach version %s', self.index, manifest['version'])
+
+    def handle(self, op, args):
+        self._maybe_reload()
+        model = self.model
+        if op == 'recommend_batch':
+            user_ids, top_k = args
+            return model.recommend_batch(user_ids, top_k=top_k)
+        if op == 'ping':
+            return {'shard': self.index, 'version': self.version, 'users': len(model.users)}
+        raise ValueError(f'unknown op: {op}')
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ('ok', self.handle(op, args))
+                except Exception as e:
+                    reply = ('error', f'{type(e).__name__}: {e}')
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address) and sys.platform != 'win32':
+            os.remove(self.address)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        logger.info('Shard %s serving %d users on %s', self.index, len(self.model.users), self.address)
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                # Listener closed
+                return
+            except Exception:
+                # Failed handshake (wrong authkey, dropped client)
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+
+
+class ShardUnavailable(RuntimeError):
+    """A shard worker could not be reached or failed to answer."""
+
+
+class ShardRouter:
+    """Forward user recommendation calls to shard workers and merge the replies.
+
+    Keeps a small pool of open connections per shard; a batch is split by
+    shard, sent to every shard first and then collected, so shards work in
+    parallel.
+    """
+
+    def __init__(self, addresses, authkey):
+        self.addresses = list(addresses)
+        self.n_shards = len(self.addresses)
+        self.authkey = authkey
+        self._pools = [queue.LifoQueue() for _ in self.addresses]
+
+    def _acquire(self, shard):
+        try:
+            return self._pools[shard].get_nowait()
+        except queue.Empty:
+            try:
+                return Client(self.addresses[shard], authkey=self.authkey)
+            except Exception as e:
+                raise ShardUnavailable(f'shard {shard} at {self.addresses[shard]}: {e}') from e
+
+    def _release(self, shard, conn):
+        self._pools[shard].put(conn)
+
+    def call(self, requests):
+        """Send {shard: (op, args)} to all shards, then collect {shard: result}."""
+        sent = {}
+        try:
+            for shard, request in requests.items():
+                conn = self._acquire(shard)
+                try:
+                    conn.send(request)
+                except Exception as e:
+                    conn.close()
+                    raise ShardUnavailable(f'shard {shard}: {e}') from e
+                sent[shard] = conn
+            results = {}
+            for shard in list(sent):
+                conn = sent.pop(shard)
+                try:
+                    status, value = conn.recv()
+                except Exception as e:
+                    conn.close()
+                    raise ShardUnavailable(f'shard {shard}: {e}') from e
+                self._release(shard, conn)
+                if status != 'ok':
+                    raise ShardUnavailable(f'shard {shard}: {value}')
+                results[shard] = value
+            return results
+        finally:
+            # Connections with an unread reply cannot be reused
+            for conn in sent.values():
+                conn.close()
+
+    def recommend_batch(self, user_ids, top_k=5):
+        parts = partition(user_ids, self.n_shards)
+        results = self.call({shard: ('recommend_batch', (users, top_k)) for shard, users in parts.items()})
+        merged = {}
+        for part in results.values():
+            merged.update(part)
+        return {u: merged.get(u, []) for u in user_ids}
+
+    def recommend(self, user_id, top_k=5):
+        return self.recommend_batch([user_id], top_k)[user_id]
+
+    def ping(self):
+        return self.call({shard: ('ping', None) for shard in range(self.n_shards)})
+
+
+class ShardedModel:
+    """Model facade for the app: user calls go to the shard workers, session
+    calls to the local item-side model."""
+
+    def __init__(self, router, item_model):
+        self.router = router
+        self.item_model = item_model
+        self.items = item_model.items
+        self.users = []
+
+    def recommend(self, user_id, top_k=5):
+        return self.router.recommend(user_id, top_k)
+
+    def recommend_batch(self, user_ids, top_k=5):
+        return self.router.recommend_batch(user_ids, top_k)
+
+    def recommend_for_session(self, session_item_ids, top_k=5):
+        return self.item_model.recommend_for_session(session_item_ids, top_k)
+
+    def recommend_for_session_with_weights(self, session_item_weights, top_k=5, cooc_blend=None):
+        return self.item_model.recommend_for_session_with_weights(session_item_weights, top_k, cooc_blend)
+
+
+def attach_sharded(root, addresses=None, authkey=None):
+    """Return (ShardedModel, item arrays, items manifest) for shards built under `root`."""
+    from sample_recommender import RecommenderSystem
+    items_root = os.path.join(root, ITEMS_DIR)
+    manifest = read_manifest(items_root)
+    if manifest is None:
+        raise FileNotFoundError(f'no shards built under {root}')
+    item_model, arrays, manifest = attach(items_root, RecommenderSystem, manifest)
+    n_shards = manifest['meta']['n_shards']
+    addresses = addresses or [shard_address(root, i) for i in range(n_shards)]
+    if len(addresses) != n_shards:
+        raise ValueError(f'{len(addresses)} shard addresses for {n_shards} shards')
+    return ShardedModel(ShardRouter(addresses, authkey or shard_authkey(root)), item_model), arrays, manifest
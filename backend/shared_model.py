@@ -0,0 +1,124 @@
+# backend/shared_model.py
+# Publish a trained model's arrays once as memory-mapped .npy files so every
+# worker process attaches them zero-copy (pages are shared through the OS page
+# cache), with versioned directories for coordinated reloads.
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+
+
+def _default_root():
+    # Prefer RAM-backed /dev/shm on Linux; fall back to a models/ subdirectory
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', 'recsys_shared')
+    return os.path.join('models', 'shared')
+
+
+def shared_root():
+    return os.environ.get('SHARED_MODEL_DIR') or _default_root()
+
+
+def publish(model, root, extra_arrays=None, meta=None, keep=2):
+    """Write `model.to_arrays()` (plus `extra_arrays`) under a new version directory.
+
+    The manifest is swapped in atomically last, so readers only ever see a
+    complete version. Returns the manifest dict.
+    """
+    version = time.time_ns()
+    version_dir = os.path.join(root, f'v{version}')
+    os.makedirs(version_dir, exist_ok=True)
+
+    arrays = dict(model.to_arrays())
+    arrays.update(extra_arrays or {})
+    entries = {}
+    for key, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype == object:
+            raise TypeError(f"array '{key}' has object dtype and cannot be memory-mapped")
+        np.save(os.path.join(version_dir, f'{key}.npy'), arr, allow_pickle=False)
+        entries[key] = {'file': f'{key}.npy', 'shape': list(arr.shape), 'dtype': str(arr.dtype)}
+
+    manifest = {'version': version, 'dir': f'v{version}', 'arrays': entries,
+                'meta': meta or {}, 'published': time.time()}
+    tmp = os.path.join(root, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+    _prune(root, keep=keep, current=manifest['dir'])
+    return manifest
+
+
+def _prune(root, keep, current):
+    """Remove old version directories, keeping the newest `keep` (workers may
+    still be finishing requests on the previous one)."""
+    versions = sorted((d for d in os.listdir(root) if d.startswith('v') and d[1:].isdigit()),
+                      key=lambda d: int(d[1:]), reverse=True)
+    for d in versions[keep:]:
+        if d != current:
+            shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+
+
+def read_manifest(root):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_arrays(root, manifest):
+    """Map every array of a published version read-only (no copy)."""
+    version_dir = os.path.join(root, manifest['dir'])
+    return {key: np.load(os.path.join(version_dir, entry['file']), mmap_mode='r', allow_pickle=False)
+            for key, entry in manifest['arrays'].items()}
+
+
+def attach(root, model_factory, manifest=None):
+    """Return (model, arrays, manifest) for the current published version."""
+    manifest = manifest or read_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(f'no shared model published under {root}')
+    arrays = load_arrays(root, manifest)
+    model = model_factory()
+    model.from_arrays(arrays)
+    return model, arrays, manifest
+
+
+class ManifestWatcher:
+    """Cheaply detect a newly published version (at most one stat per `interval`)."""
+
+    def __init__(self, root, version=None, interval=1.0):
+        self.root = root
+        self.version = version
+        self.interval = interval
+        self._next_check = 0.0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Return the new manifest if the published version changed, else None."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        with self._lock:
+            if now < self._next_check:
+                return None
+            self._next_check = now + self.interval
+            try:
+                mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+            except OSError:
+                return None
+            if mtime == self._mtime:
+                return None
+            self._mtime = mtime
+            manifest = read_manifest(self.root)
+            if manifest is None or manifest['version'] == self.version:
+                return None
+            self.version = manifest['version']
+            return manifest
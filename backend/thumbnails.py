@@ -0,0 +1,162 @@
+# backend/thumbnails.py
+# Non-blocking thumbnail cache: bounded background fetches, in-flight dedup and a
+# content-addressed blob store on disk.
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_UPSTREAM = 'https://picsum.photos/seed/{item_id}/200/200'
+
+# 1x1 transparent GIF returned while a thumbnail is being fetched
+PLACEHOLDER_GIF = (b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04"
+                   b"\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+
+
+def sniff_mimetype(data):
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class ThumbnailStore:
+    """Serve thumbnails from disk and fetch misses in the background.
+
+    - Images are stored once under `blobs/<sha[:2]>/<sha256>`; `refs/<item_id>`
+      maps an item to its blob and mimetype. Legacy `<item_id>.jpg` files in
+      `root` are still served.
+    - At most `max_workers` fetches run at once and at most `max_pending` are
+      queued; concurrent requests for the same item share one fetch.
+    - Failed fetches are not retried for `retry_after` seconds. At most
+      `max_failed` failures are remembered; the oldest are forgotten first.
+    - `upstream` is a URL template with an `{item_id}` placeholder.
+    """
+
+    def __init__(self, root, upstream=None, max_workers=4, max_pending=1000, timeout=10, retry_after=300,
+                 max_failed=10000):
+        self.root = root
+        self.upstream = upstream or DEFAULT_UPSTREAM
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.max_pending = max_pending
+        self.max_failed = max_failed
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.ref_dir = os.path.join(root, 'refs')
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumb')
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # item_id -> time of its last failure, oldest first
+        self._failed = OrderedDict()
+        self._session = threading.local()
+
+    def lookup(self, item_id):
+        """Return (path, mimetype) of a stored thumbnail, or None on a miss."""
+        legacy = os.path.join(self.root, f'{item_id}.jpg')
+        if os.path.exists(legacy):
+            return legacy, 'image/jpeg'
+        try:
+            with open(os.path.join(self.ref_dir, str(item_id)), encoding='utf-8') as f:
+                digest, mimetype = f.read().split()
+        except (OSError, ValueError):
+            return None
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            return None
+        return path, mimetype
+
+    def fetch_async(self, item_id):
+        """Start fetching `item_id` in the background; returns the Future or None
+        if it is already stored, recently failed, or the queue is full."""
+        with self._lock:
+            future = self._inflight.get(item_id)
+            if future is not None:
+                return future
+            failed_at = self._failed.get(item_id)
+            if failed_at is not None:
+                if time.time() - failed_at < self.retry_after:
+                    return None
+                del self._failed[item_id]
+            if len(self._inflight) >= self.max_pending:
+                return None
+            if self.lookup(item_id) is not None:
+                return None
+            future = self._pool.submit(self._fetch, item_id)
+            self._inflight[item_id] = future
+        future.add_done_callback(lambda _f, iid=item_id: self._done(iid))
+        return future
+
+    def prefetch(self, item_ids):
+        """Queue fetches for every missing item; returns the started futures."""
+        futures = []
+        for item_id in item_ids:
+            future = self.fetch_async(item_id)
+            if future is not None:
+                futures.append(future)
+        return futures
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _done(self, item_id):
+        with self._lock:
+            self._inflight.pop(item_id, None)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _http(self):
+        session = getattr(self._session, 'value', None)
+        if session is None:
+            import requests
+            session = self._session.value = requests.Session()
+        return session
+
+    def _fetch(self, item_id):
+        try:
+            r = self._http().get(self.upstream.format(item_id=item_id), timeout=self.timeout)
+            mimetype = sniff_mimetype(r.content) if r.status_code == 200 else None
+            if mimetype is None:
+                raise ValueError(f'bad thumbnail response: {r.status_code}')
+            return self.store(item_id, r.content, mimetype)
+        except Exception:
+            self._record_failure(item_id)
+            return None
+
+    def _record_failure(self, item_id):
+        now = time.time()
+        with self._lock:
+            failed = self._failed
+            failed.pop(item_id, None)
+            failed[item_id] = now
+            # Drop failures whose retry window has passed, then any excess
+            while failed:
+                oldest, failed_at = next(iter(failed.items()))
+                if now - failed_at < self.retry_after and len(failed) <= self.max_failed:
+                    break
+                del failed[oldest]
+
+    def store(self, item_id, data, mimetype):
+        """Write image bytes to the blob store and point `item_id` at them."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, data)
+        os.makedirs(self.ref_dir, exist_ok=True)
+        _write_atomic(os.path.join(self.ref_dir, str(item_id)), f'{digest} {mimetype}'.encode('utf-8'))
+        return path
@@ -0,0 +1,121 @@
+# backend/windowing.py
+# Sliding-window, time-decayed interaction weights that can be advanced
+# incrementally: events are aggregated once into time buckets, and moving the
+# window subtracts the buckets that fell out of it instead of re-aggregating
+# the whole history.
+import numpy as np
+import pandas as pd
+
+_KEY = ['user_id', 'product_id']
+
+
+class WindowedInteractions:
+    """Decayed (user, item) weight sums over the last `window` seconds.
+
+    - `half_life` (seconds): weights halve with every `half_life` of age
+      (None: no decay). Decay is applied forward from a fixed landmark time,
+      so stored sums never need rescaling as time passes; `matrix(now)`
+      multiplies by a single factor.
+    - `bucket` (seconds): events are grouped by time bucket; a bucket is
+      dropped once all of it is older than the window, so the window edge has
+      bucket granularity.
+
+    Timestamps are read from the `timestamp` column (epoch ms), like the loaders.
+    """
+
+    def __init__(self, window=None, half_life=None, bucket=3600.0):
+        self.window = window
+        self.half_life = half_life
+        self.bucket = bucket
+        self._bucket_ms = max(1, int(bucket * 1000))
+        self.landmark = None
+        self.newest = None
+        self.buckets = {}
+        # Running sum over live buckets, and how many live buckets hold each pair
+        self.total = pd.Series(dtype=np.float64, index=pd.MultiIndex.from_arrays([[], []], names=_KEY))
+        self.counts = pd.Series(dtype=np.int64, index=self.total.index)
+
+    def _growth(self, ts):
+        if self.half_life is None:
+            return np.ones(len(ts))
+        return np.exp2((ts - self.landmark) / (self.half_life * 1000.0))
+
+    def _rebase(self, landmark):
+        """Move the landmark forward before forward-decay factors get large."""
+        factor = float(np.exp2(-(landmark - self.landmark) / (self.half_life * 1000.0)))
+        self.buckets = {b: part * factor for b, part in self.buckets.items()}
+        self.total = self.total * factor
+        self.landmark = landmark
+
+    def _cutoff(self, now):
+        return None if self.window is None else now - self.window * 1000.0
+
+    def add(self, events):
+        """Fold a frame of events (user_id, product_id, weight, timestamp) in."""
+        if events.empty:
+            return 0
+        ts = events['timestamp'].to_numpy(dtype=np.int64)
+        if self.landmark is None:
+            self.landmark = int(ts.min())
+        newest = int(ts.max()) if self.newest is None else max(self.newest, int(ts.max()))
+        if self.half_life is not None and (newest - self.landmark) / (self.half_life * 1000.0) > 40:
+            self._rebase(newest)
+        frame = pd.DataFrame({
+            'bucket': ts // self._bucket_ms,
+            'user_id': events['user_id'].to_numpy(),
+            'product_id': events['product_id'].to_numpy(),
+            'weight': events['weight'].to_numpy(dtype=np.float64) * self._growth(ts),
+        })
+        cutoff = self._cutoff(newest)
+        if cutoff is not None:
+            # Late events for buckets that already left the window
+            frame = frame[(frame['bucket'] + 1) * self._bucket_ms > cutoff]
+        grouped = frame.groupby(['bucket'] + _KEY)['weight'].sum()
+        new_pairs = []
+        for b, part in grouped.groupby(level=0):
+            part = part.droplevel(0)
+            old = self.buckets.get(b)
+            if old is None:
+                self.buckets[b] = part
+                new_pairs.append(part.index)
+            else:
+                self.buckets[b] = old.add(part, fill_value=0)
+                new_pairs.append(part.index.difference(old.index))
+        self.total = self.total.add(grouped.groupby(level=_KEY).sum(), fill_value=0)
+        for index in new_pairs:
+            self.counts = self.counts.add(pd.Series(1, index=index), fill_value=0).astype(np.int64)
+        self.newest = newest
+        self.expire(newest)
+        return len(frame)
+
+    def expire(self, now=None):
+        """Drop buckets entirely older than the window at `now` (default: the
+        newest event). Returns how many buckets were dropped."""
+        now = self.newest if now is None else now
+        cutoff = None if now is None else self._cutoff(now)
+        if cutoff is None:
+            return 0
+        expired = [b for b in self.buckets if (b + 1) * self._bucket_ms <= cutoff]
+        for b in expired:
+            part = self.buckets.pop(b)
+            self.total = self.total.sub(part, fill_value=0)
+            self.counts = self.counts.sub(pd.Series(1, index=part.index), fill_value=0).astype(np.int64)
+        if expired:
+            # Pairs with no live bucket go away exactly (no rounding residue)
+            live = self.counts > 0
+            self.counts = self.counts[live]
+            self.total = self.total[live.reindex(self.total.index, fill_value=False)]
+        return len(expired)
+
+    def matrix(self, now=None):
+        """Users x items DataFrame of decayed weights as of `now` (default: newest event)."""
+        now = self.newest if now is None else now
+        values = self.total
+        if self.half_life is not None and now is not None:
+            values = values * float(np.exp2(-(now - self.landmark) / (self.half_life * 1000.0)))
+        matrix = values.sort_index().unstack(fill_value=0.0)
+        return matrix.sort_index(axis=1)
+
+    def __len__(self):
+        """Number of (user, item) pairs in the window."""
+        return len(self.total)
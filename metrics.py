@@ -13,6 +13,13 @@ def recall_at_k(true_items, predicted_items, k=5):
 	pred_k = predicted_items[:k]
 	return len(set(pred_k) & set(true_items)) / float(len(true_items))
 
+def top_k_overlap(reference_items, candidate_items, k=5):
+	"""Share of the reference top-k that the candidate top-k also contains."""
+	ref_k = reference_items[:k]
+	if len(ref_k) == 0:
+		return 1.0
+	return len(set(ref_k) & set(candidate_items[:k])) / float(len(ref_k))
+
 def evaluate_model(recommender, interactions_df, users_sample=None, k=5):
 	# interactions_df expected to have columns: user_id, product_id, weight
 	users = users_sample if users_sample is not None else interactions_df['user_id'].unique()[:100]
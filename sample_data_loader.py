@@ -4,31 +4,20 @@ import os
 RAW_PATH = "data/raw/"
 
 def load_events(sample_frac=0.01, max_users=100, max_items=100, nrows=50000):
-    """Load sample of events with configurable limits."""
-    events_path = os.path.join(RAW_PATH, "events.csv")
+    """Load sample of events with configurable limits.
 
-    df = pd.read_csv(events_path, nrows=nrows)
-
-    df = df.rename(columns={
-        "visitorid": "user_id",
-        "itemid": "product_id",
-        "event": "interaction_type"
-    })
-
-    # Weight interactions by type
-    event_weights = {"view": 1, "addtocart": 3, "transaction": 5}
-    df["weight"] = df["interaction_type"].map(event_weights)
+    The file is streamed in two chunked passes (see
+    `backend.data_loader.EventStream`): the most active users and items are
+    counted over the first `nrows` rows, then only their events are read.
+    """
+    from backend.data_loader import load_events_filtered
 
-    # Filter to top users and items
-    top_users = df["user_id"].value_counts().nlargest(max_users).index
-    top_items = df["product_id"].value_counts().nlargest(max_items).index
-    df = df[df["user_id"].isin(top_users) & df["product_id"].isin(top_items)]
+    df = load_events_filtered(path=os.path.join(RAW_PATH, "events.csv"), max_users=max_users,
+                              max_items=max_items, nrows=nrows)
 
     if sample_frac < 1.0:
         df = df.sample(frac=sample_frac, random_state=42).reset_index(drop=True)
-    else:
-        df = df.reset_index(drop=True)
-        
+
     return df
 
 def load_items(relevant_product_ids=None, nrows=100000):
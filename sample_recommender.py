@@ -4,32 +4,251 @@ from sklearn.metrics.pairwise import cosine_similarity
 import joblib
 from typing import Optional
 
+PRECISIONS = ('float64', 'float32', 'float16', 'int8')
+
+# Users scored together per matrix product in recommend_batch
+BATCH_BLOCK = 16
+
+# (matrix attribute, per-row scale attribute, to_arrays key)
+_STORED_MATRICES = (
+    ('user_sim_matrix', 'user_sim_scales', 'user_sim'),
+    ('item_sim_matrix', 'item_sim_scales', 'item_sim'),
+)
+
+
+def quantize_rows(matrix, precision):
+    """Store `matrix` at `precision`; returns (data, per-row scales or None).
+
+    int8 keeps one float32 scale per row (max |value| / 127) so every row uses
+    the full code range and the order of values within a row is preserved.
+    At every reduced precision, non-zero values that would round to 0 (e.g.
+    old events under time decay) keep the smallest code of their sign, so
+    "has interacted" checks (`> 0`) still hold.
+    """
+    matrix = np.asarray(matrix)
+    if precision == 'float64':
+        return matrix.astype(np.float64, copy=False), None
+    if precision in ('float32', 'float16'):
+        data = matrix.astype(precision)
+        lost = (data == 0) & (matrix != 0)
+        if lost.any():
+            tiny = np.nextafter(data.dtype.type(0), data.dtype.type(1))
+            data[lost] = np.sign(matrix[lost]) * tiny
+        return data, None
+    if precision != 'int8':
+        raise ValueError(f"unknown precision: {precision}")
+    values = matrix.astype(np.float32, copy=False)
+    scales = np.abs(values).max(axis=1) / 127.0 if values.size else np.zeros(len(values), np.float32)
+    scales = scales.astype(np.float32)
+    safe = np.where(scales > 0, scales, 1.0)[:, None]
+    data = np.clip(np.rint(values / safe), -127, 127).astype(np.int8)
+    # Keep small non-zero values non-zero (see above)
+    data = np.where((data == 0) & (matrix != 0), np.sign(matrix), data).astype(np.int8)
+    return data, scales
+
+
+def dequantize_rows(data, scales, rows):
+    """Return `data[rows]` as floats, undoing int8 scaling when `scales` is set."""
+    out = data[rows]
+    if scales is None:
+        return out.astype(np.float64, copy=False) if out.dtype == np.float64 else out.astype(np.float32)
+    return out.astype(np.float32) * (scales[rows][..., None] if np.ndim(rows) else scales[rows])
+
+
+def time_weighted(interactions_df, half_life=None, window=None, now=None):
+    """Events reweighted by age, restricted to a trailing time window.
+
+    - `half_life` (seconds): each event's weight is scaled by
+      `0.5 ** (age / half_life)`; None keeps the static weights.
+    - `window` (seconds): only events younger than this are kept.
+    - `now`: reference time in the `timestamp` column's units (epoch ms);
+      defaults to the newest event, so a rebuild of the same data is stable.
+
+    Returns a (user_id, product_id, weight) frame; computed on whole columns.
+    """
+    ts = interactions_df["timestamp"].to_numpy(dtype=np.int64)
+    if now is None:
+        now = int(ts.max()) if len(ts) else 0
+    age = (now - ts) / 1000.0
+    keep = age >= 0
+    if window is not None:
+        keep &= age < window
+    weights = interactions_df["weight"].to_numpy(dtype=np.float64)
+    if half_life is not None:
+        weights = weights * np.exp2(-age / half_life)
+    out = interactions_df.loc[keep, ["user_id", "product_id"]].copy()
+    out["weight"] = weights[keep]
+    return out
+
+
+def top_k_indices(scores, k):
+    """Indices of the `k` largest values along the last axis, largest first.
+
+    Equal values are ordered by descending index (a stable argsort, reversed),
+    so one-at-a-time and batched scoring pick the same neighbours and items.
+    Selection is linear (argpartition); only the `k` winners are sorted.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k == n:
+        cols = np.broadcast_to(np.arange(n), scores.shape)
+    else:
+        kth = -np.partition(-scores, k - 1, axis=-1)[..., k - 1:k]
+        above = scores > kth
+        ties = scores == kth
+        need = k - above.sum(axis=-1, keepdims=True)
+        # Ties at the cut-off: keep the highest indices
+        rank = np.cumsum(ties[..., ::-1], axis=-1)[..., ::-1]
+        chosen = above | (ties & (rank <= need))
+        cols = np.nonzero(chosen)[-1].reshape(scores.shape[:-1] + (k,))
+    values = np.take_along_axis(scores, cols, axis=-1)
+    order = np.lexsort((-cols, -values), axis=-1)
+    return np.take_along_axis(cols, order, axis=-1)
+
+
+def build_user_item_matrix(interactions_df, half_life=None, window=None, now=None):
+    """Users x items matrix of summed interaction weights.
+
+    With `half_life` and/or `window` (seconds), weights decay with event age
+    and older events are left out (see `time_weighted`).
+
+    Also accepts an iterable of event frames (e.g. `backend.data_loader.EventStream`):
+    each chunk is summed by (user, item) as it arrives and the matrix is
+    pivoted once, so the raw events are never held together. Time weighting
+    then needs `now` (or the stream's `newest`).
+    """
+    weighted = half_life is not None or window is not None
+    if not isinstance(interactions_df, pd.DataFrame):
+        if weighted and now is None:
+            now = getattr(interactions_df, 'newest', None)
+            if now is None:
+                raise ValueError("time weighting over chunks needs `now`")
+        sums = []
+        for chunk in interactions_df:
+            if weighted:
+                chunk = time_weighted(chunk, half_life, window, now)
+            sums.append(chunk.groupby(["user_id", "product_id"])["weight"].sum())
+            if len(sums) > 8:
+                sums = [pd.concat(sums).groupby(level=[0, 1]).sum()]
+        if not sums:
+            return pd.DataFrame(index=pd.Index([], name="user_id"), columns=pd.Index([], name="product_id"))
+        total = pd.concat(sums).groupby(level=[0, 1]).sum()
+        return total.unstack(fill_value=0).sort_index().sort_index(axis=1)
+    if weighted:
+        interactions_df = time_weighted(interactions_df, half_life, window, now)
+    return interactions_df.pivot_table(
+        index="user_id",
+        columns="product_id",
+        values="weight",
+        aggfunc="sum",
+        fill_value=0
+    )
+
+
+def build_similarities(user_item_matrix):
+    """Return (user_sim, item_sim) cosine similarity matrices at float64."""
+    user_sim = cosine_similarity(user_item_matrix)
+    item_sim = cosine_similarity(user_item_matrix.T)
+    # Remove self-similarity from diagonal
+    np.fill_diagonal(user_sim, 0)
+    return user_sim, item_sim
+
+
 class RecommenderSystem:
-    def __init__(self):
+    def __init__(self, precision='float64'):
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}")
+        # Storage precision of the similarity and user-item arrays; with int8
+        # the arrays hold codes and the *_scales attributes hold per-row scales
+        self.precision = precision
         self.user_item_matrix = None
         self.user_sim_matrix = None  # This starts as None
+        self.item_sim_matrix = None
+        self.user_item_scales = None
+        self.user_sim_scales = None
+        self.item_sim_scales = None
         self.users = None
         self.items = None
         self.model_path: Optional[str] = None
+        # Optional co-occurrence neighbours (see backend/cooccurrence.py) and
+        # how much of them to blend into session scores (0 = similarity only)
+        self.cooccurrence = None
+        self.cooc_blend = 0.0
+        self._cooc_rows = None
 
-    def train(self, interactions_df):
-        # Create user-item interaction matrix
-        self.user_item_matrix = interactions_df.pivot_table(
-            index="user_id",
-            columns="product_id",
-            values="weight",
-            aggfunc="sum",
-            fill_value=0
-        )
+    def train(self, interactions_df, half_life=None, window=None):
+        # Create user-item interaction matrix (optionally time-decayed and windowed)
+        user_item_matrix = build_user_item_matrix(interactions_df, half_life=half_life, window=window)
+        # Calculate similarity matrices
+        user_sim, item_sim = build_similarities(user_item_matrix)
+        self.assemble(user_item_matrix, user_sim, item_sim)
+
+    def train_windowed(self, windowed, now=None):
+        """Train from a `backend.windowing.WindowedInteractions` as of `now`.
+
+        Adding events to it and expiring old buckets does not re-read or
+        re-aggregate the rest of the history; only the similarities are
+        recomputed here.
+        """
+        user_item_matrix = windowed.matrix(now)
+        user_sim, item_sim = build_similarities(user_item_matrix)
+        self.assemble(user_item_matrix, user_sim, item_sim)
+
+    def assemble(self, user_item_matrix, user_sim, item_sim):
+        """Install precomputed float64 matrices (see backend/pipeline.py) and
+        convert them to the configured precision."""
+        self.user_item_matrix = user_item_matrix
         self.users = self.user_item_matrix.index.tolist()
         self.items = self.user_item_matrix.columns.tolist()
+        self.user_sim_matrix = user_sim
+        self.item_sim_matrix = item_sim
+        self.user_item_scales = self.user_sim_scales = self.item_sim_scales = None
+        precision, self.precision = self.precision, 'float64'
+        self.set_precision(precision)
 
-        # Calculate similarity matrices
-        self.user_sim_matrix = cosine_similarity(self.user_item_matrix)
-        self.item_sim_matrix = cosine_similarity(self.user_item_matrix.T)
-        
-        # Remove self-similarity from diagonal
-        np.fill_diagonal(self.user_sim_matrix, 0)
+    def set_precision(self, precision):
+        """Convert the stored arrays to `precision` ('float64', 'float32', 'float16' or 'int8')."""
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}")
+        if precision == 'float64' and self.precision == 'float64':
+            return self
+        if self.user_item_matrix is not None:
+            values = self._dense('user_item_matrix', 'user_item_scales')
+            data, self.user_item_scales = quantize_rows(values, precision)
+            self.user_item_matrix = pd.DataFrame(data, index=self.user_item_matrix.index,
+                                                 columns=self.user_item_matrix.columns, copy=False)
+        for attr, scale_attr, _ in _STORED_MATRICES:
+            if getattr(self, attr, None) is not None:
+                data, scales = quantize_rows(self._dense(attr, scale_attr), precision)
+                setattr(self, attr, data)
+                setattr(self, scale_attr, scales)
+        self.precision = precision
+        return self
+
+    def _dense(self, attr, scale_attr):
+        """Full matrix as floats (float64 unless already reduced)."""
+        data = getattr(self, attr)
+        if isinstance(data, pd.DataFrame):
+            data = data.values
+        scales = getattr(self, scale_attr, None)
+        if scales is None:
+            return data
+        return data.astype(np.float32) * scales[:, None]
+
+    def memory_usage(self):
+        """Bytes held by the model arrays, by array name."""
+        usage = {}
+        for attr in ('user_item_matrix', 'user_sim_matrix', 'item_sim_matrix',
+                     'user_item_scales', 'user_sim_scales', 'item_sim_scales'):
+            value = getattr(self, attr, None)
+            if isinstance(value, pd.DataFrame):
+                value = value.values
+            if value is not None:
+                usage[attr] = int(value.nbytes)
+        return usage
 
     def save(self, path: str):
         """Save the trained model to disk."""
@@ -38,7 +257,12 @@ class RecommenderSystem:
             'user_sim_matrix': self.user_sim_matrix,
             'users': self.users,
             'items': self.items,
-            'item_sim_matrix': getattr(self, 'item_sim_matrix', None)
+            'item_sim_matrix': getattr(self, 'item_sim_matrix', None),
+            'cooccurrence': self.cooccurrence,
+            'precision': self.precision,
+            'user_item_scales': self.user_item_scales,
+            'user_sim_scales': self.user_sim_scales,
+            'item_sim_scales': self.item_sim_scales,
         }
         joblib.dump(payload, path)
         self.model_path = path
@@ -51,7 +275,72 @@ class RecommenderSystem:
         self.users = payload['users']
         self.items = payload['items']
         self.item_sim_matrix = payload.get('item_sim_matrix', None)
+        self.user_item_scales = payload.get('user_item_scales')
+        self.user_sim_scales = payload.get('user_sim_scales')
+        self.item_sim_scales = payload.get('item_sim_scales')
+        self.set_cooccurrence(payload.get('cooccurrence'))
         self.model_path = path
+        # Convert older/other-precision artifacts to the configured precision
+        wanted = self.precision
+        self.precision = payload.get('precision', 'float64')
+        if wanted != self.precision:
+            self.set_precision(wanted)
+
+    def set_cooccurrence(self, arrays):
+        """Attach co-occurrence neighbours built by `backend.cooccurrence`."""
+        self.cooccurrence = arrays
+        self._cooc_rows = None
+        if arrays is not None:
+            self._cooc_rows = {it: row for row, it in enumerate(arrays['cooc_items'].tolist())}
+
+    def fit_cooccurrence(self, source=None, **params):
+        """Build the co-occurrence model in one streaming pass over `source`."""
+        from backend.cooccurrence import build_cooccurrence
+        self.set_cooccurrence(build_cooccurrence(source, **params))
+
+    def to_arrays(self):
+        """Return the trained state as plain numpy arrays (see `from_arrays`)."""
+        arrays = {
+            'user_item': np.ascontiguousarray(self.user_item_matrix.values),
+            'user_sim': np.ascontiguousarray(self.user_sim_matrix),
+            'users': np.asarray(self.users),
+            'items': np.asarray(self.items),
+        }
+        if getattr(self, 'item_sim_matrix', None) is not None:
+            arrays['item_sim'] = np.ascontiguousarray(self.item_sim_matrix)
+        if self.user_item_scales is not None:
+            arrays['user_item_scale'] = self.user_item_scales
+        for attr, scale_attr, key in _STORED_MATRICES:
+            if getattr(self, scale_attr, None) is not None:
+                arrays[f'{key}_scale'] = getattr(self, scale_attr)
+        if self.cooccurrence is not None:
+            arrays.update(self.cooccurrence)
+        return arrays
+
+    def from_arrays(self, arrays):
+        """Rebuild the model around existing arrays without copying them.
+
+        Used to attach memory-mapped arrays shared between worker processes;
+        the arrays are treated as read-only.
+        """
+        self.user_item_matrix = pd.DataFrame(
+            arrays['user_item'],
+            index=pd.Index(arrays['users']),
+            columns=pd.Index(arrays['items']),
+            copy=False,
+        )
+        self.user_sim_matrix = arrays['user_sim']
+        self.item_sim_matrix = arrays.get('item_sim')
+        self.user_item_scales = arrays.get('user_item_scale')
+        self.user_sim_scales = arrays.get('user_sim_scale')
+        self.item_sim_scales = arrays.get('item_sim_scale')
+        self.precision = 'int8' if self.user_sim_scales is not None else str(self.user_sim_matrix.dtype)
+        self.users = self.user_item_matrix.index.tolist()
+        self.items = self.user_item_matrix.columns.tolist()
+        if 'cooc_items' in arrays:
+            self.set_cooccurrence({k: arrays[k] for k in ('cooc_items', 'cooc_indptr', 'cooc_neighbors', 'cooc_scores')})
+        else:
+            self.set_cooccurrence(None)
 
     def recommend(self, user_id, top_k=5):
         if self.user_item_matrix is None or self.user_sim_matrix is None:
@@ -61,25 +350,66 @@ class RecommenderSystem:
             return []
 
         user_idx = self.user_item_matrix.index.get_loc(user_id)
-        user_similarities = self.user_sim_matrix[user_idx]
+        user_similarities = dequantize_rows(self.user_sim_matrix, self.user_sim_scales, user_idx)
 
         # Find top similar users
-        similar_users_idx = np.argsort(user_similarities)[::-1][:20]
+        similar_users_idx = top_k_indices(user_similarities, 20)
 
         # Aggregate scores from similar users
         similarities = user_similarities[similar_users_idx]
-        scores = np.array([self.user_item_matrix.iloc[idx].values for idx in similar_users_idx])
+        user_item = self.user_item_matrix.values
+        scores = dequantize_rows(user_item, self.user_item_scales, similar_users_idx)
         recommended_scores = np.dot(similarities, scores) / (np.sum(similarities) + 1e-9)
 
         # Exclude items already interacted with
-        already_interacted = self.user_item_matrix.loc[user_id].values > 0
+        already_interacted = user_item[user_idx] > 0
         recommended_scores[already_interacted] = -1
 
-        top_product_idx = np.argsort(recommended_scores)[::-1][:top_k]
+        top_product_idx = top_k_indices(recommended_scores, top_k)
         top_product_ids = self.user_item_matrix.columns[top_product_idx].tolist()
         
         return top_product_ids
 
+    def recommend_batch(self, user_ids, top_k=5, neighbours=20, block=BATCH_BLOCK):
+        """`recommend` for many users at once; returns {user_id: [item ids]}.
+
+        Users are scored `block` at a time: each neighbour row is gathered
+        once per block, however many of the block's users share it, and the
+        block is scored with one matrix product, so memory stays at
+        block x (distinct neighbours + items). Unknown users map to [].
+        """
+        out = {u: [] for u in user_ids}
+        if self.user_item_matrix is None or self.user_sim_matrix is None:
+            return out
+        index = self.user_item_matrix.index
+        known = [u for u in out if u in index]
+        if not known:
+            return out
+        user_idx = index.get_indexer(known)
+        user_item = self.user_item_matrix.values
+        columns = self.user_item_matrix.columns
+
+        for start in range(0, len(known), block):
+            rows = user_idx[start:start + block]
+            sims = dequantize_rows(self.user_sim_matrix, self.user_sim_scales, rows)
+            # Same neighbour selection as recommend(), row by row
+            similar_idx = top_k_indices(sims, neighbours)
+            similarities = np.take_along_axis(sims, similar_idx, axis=1)
+            needed, inverse = np.unique(similar_idx, return_inverse=True)
+            neighbour_rows = dequantize_rows(user_item, self.user_item_scales, needed)
+            weights = np.zeros((len(rows), len(needed)),
+                               dtype=np.result_type(similarities.dtype, neighbour_rows.dtype))
+            np.put_along_axis(weights, inverse.reshape(similar_idx.shape), similarities, axis=1)
+            recommended = weights @ neighbour_rows
+            recommended /= (similarities.sum(axis=1) + 1e-9)[:, None]
+
+            # Exclude items already interacted with
+            recommended[user_item[rows] > 0] = -1
+
+            for u, row in zip(known[start:start + block], top_k_indices(recommended, top_k)):
+                out[u] = columns[row].tolist()
+        return out
+
     def recommend_for_session(self, session_item_ids, top_k=5):
         """Recommend items similar to ones user viewed in session."""
         if not hasattr(self, 'item_sim_matrix') or self.item_sim_matrix is None:
@@ -92,7 +422,7 @@ class RecommenderSystem:
         for sid in session_item_ids:
             if sid in item_index:
                 idx = item_index[sid]
-                vec = self.item_sim_matrix[idx]
+                vec = dequantize_rows(self.item_sim_matrix, self.item_sim_scales, idx)
                 if sim_sum is None:
                     sim_sum = vec.copy()
                 else:
@@ -112,24 +442,55 @@ class RecommenderSystem:
         top_idx = np.argsort(sim_scores)[::-1][:top_k]
         return [self.items[i] for i in top_idx]
 
-    def recommend_for_session_with_weights(self, session_item_weights, top_k=5):
+    def _cooc_scores(self, session_item_weights, item_index):
+        """Weighted average of normalised co-occurrence scores over self.items."""
+        if self._cooc_rows is None:
+            return None
+        arrays = self.cooccurrence
+        indptr, neighbors, scores = arrays['cooc_indptr'], arrays['cooc_neighbors'], arrays['cooc_scores']
+        out = np.zeros(len(self.items))
+        total_weight = 0.0
+        for sid, w in session_item_weights.items():
+            row = self._cooc_rows.get(sid)
+            if row is None or w <= 0:
+                continue
+            total_weight += float(w)
+            start, end = indptr[row], indptr[row + 1]
+            for nb, sc in zip(neighbors[start:end].tolist(), scores[start:end].tolist()):
+                idx = item_index.get(nb)
+                if idx is not None:
+                    out[idx] += float(w) * sc
+        if total_weight == 0.0:
+            return None
+        return out / total_weight
+
+    def recommend_for_session_with_weights(self, session_item_weights, top_k=5, cooc_blend=None):
         """Recommend items with weighted user interactions.
         
         Args:
             session_item_weights: dict mapping item_id -> weight
             top_k: number of recommendations
+            cooc_blend: share of the co-occurrence score in [0, 1]; defaults to
+                self.cooc_blend and is ignored when no co-occurrence model is loaded
         """
-        if not hasattr(self, 'item_sim_matrix') or self.item_sim_matrix is None:
+        blend = self.cooc_blend if cooc_blend is None else cooc_blend
+        has_sim = getattr(self, 'item_sim_matrix', None) is not None
+        if not has_sim and not (blend > 0 and self._cooc_rows is not None):
             return self.items[:top_k]
 
         item_index = {it: idx for idx, it in enumerate(self.items)}
+        cooc = self._cooc_scores(session_item_weights, item_index) if blend > 0 else None
+        if not has_sim:
+            if cooc is None:
+                return self.items[:top_k]
+            return self._top_excluding(cooc, session_item_weights, item_index, top_k)
 
         sim_sum = None
         total_weight = 0.0
         for sid, w in session_item_weights.items():
             if sid in item_index and w > 0:
                 idx = item_index[sid]
-                vec = self.item_sim_matrix[idx] * float(w)
+                vec = dequantize_rows(self.item_sim_matrix, self.item_sim_scales, idx) * float(w)
                 if sim_sum is None:
                     sim_sum = vec.copy()
                 else:
@@ -137,14 +498,21 @@ class RecommenderSystem:
                 total_weight += float(w)
 
         if sim_sum is None:
+            if cooc is not None:
+                return self._top_excluding(cooc, session_item_weights, item_index, top_k)
             return self.items[:top_k]
 
         sim_scores = sim_sum / (total_weight + 1e-9)
+        if cooc is not None:
+            sim_scores = (1.0 - blend) * sim_scores + blend * cooc
 
+        return self._top_excluding(sim_scores, session_item_weights, item_index, top_k)
+
+    def _top_excluding(self, scores, session_item_weights, item_index, top_k):
         # Exclude items already interacted with
         for sid in session_item_weights.keys():
             if sid in item_index:
-                sim_scores[item_index[sid]] = -1
+                scores[item_index[sid]] = -1
 
-        top_idx = np.argsort(sim_scores)[::-1][:top_k]
+        top_idx = np.argsort(scores)[::-1][:top_k]
         return [self.items[i] for i in top_idx]
\ No newline at end of file
@@ -0,0 +1,343 @@
+# Benchmark suite: train, recommend, session scoring, load_items and Flask routes
+# Usage: python scripts/benchmark.py --sizes small,medium --save-baseline
+#        python scripts/benchmark.py --sizes small,medium --threshold 0.25
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.instrumentation import percentile, REC_CACHE
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = ROOT / 'benchmarks'
+DEFAULT_OUT = BENCH_DIR / 'latest.json'
+DEFAULT_BASELINE = BENCH_DIR / 'baseline.json'
+
+# name -> (n_users, n_items, n_events)
+SIZES = {
+    'tiny': (50, 100, 2000),
+    'small': (200, 500, 5000),
+    'medium': (1000, 2000, 50000),
+    'large': (5000, 5000, 250000),
+}
+
+# Metrics compared against the baseline (lower is better)
+COMPARED_METRICS = ('wall_s', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_alloc_mb')
+
+# Calls replayed under tracemalloc per operation (tracing slows calls down, so
+# it is kept out of the timed pass)
+MEMORY_CALLS = 5
+
+
+def peak_rss_mb():
+    """Process high-water RSS in MB, or None where `resource` is unavailable.
+
+    This covers the whole process (everything run so far), so it is reported
+    once per dataset size; per-operation memory is `peak_alloc_mb`.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 2)
+    return round(peak / 1024, 2)
+
+
+def peak_alloc_mb(fn, calls, reset=None):
+    """Largest allocation peak of one `fn(arg)` call above what was allocated
+    before it (tracemalloc, which also sees numpy buffers), in MB.
+
+    `reset()`, if given, runs before each call (e.g. to replay cache misses).
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    peak = 0
+    try:
+        for arg in calls:
+            if reset is not None:
+                reset()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(arg)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return round(peak / (1024 * 1024), 2)
+
+
+def measure(fn, calls, reset=None):
+    """Run `fn(arg)` for every arg in `calls` and summarise the latencies, then
+    replay the first MEMORY_CALLS calls for their allocation peak (see peak_alloc_mb)."""
+    calls = list(calls)
+    latencies = []
+    start = time.perf_counter()
+    for arg in calls:
+        t0 = time.perf_counter()
+        fn(arg)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    wall = time.perf_counter() - start
+    return {
+        'calls': len(latencies),
+        'wall_s': round(wall, 6),
+        'p50_ms': round(percentile(latencies, 50), 4),
+        'p95_ms': round(percentile(latencies, 95), 4),
+        'p99_ms': round(percentile(latencies, 99), 4),
+        'peak_alloc_mb': peak_alloc_mb(fn, calls[:MEMORY_CALLS], reset),
+    }
+
+
+def synthetic_events(n_users, n_items, n_events, seed=42):
+    """Generate an events frame shaped like `sample_data_loader.load_events`."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    users = 1000 + np.arange(n_users)
+    items = 100001 + np.arange(n_items)
+    # Skewed popularity so the matrix looks like real traffic
+    user_p = 1.0 / np.arange(1, n_users + 1) ** 0.6
+    item_p = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    event_types = np.array(['view', 'addtocart', 'transaction'])
+    df = pd.DataFrame({
+        'timestamp': 1700000000000 + np.sort(rng.integers(0, 30 * 24 * 3600 * 1000, n_events)),
+        'user_id': rng.choice(users, size=n_events, p=user_p / user_p.sum()),
+        'product_id': rng.choice(items, size=n_events, p=item_p / item_p.sum()),
+        'interaction_type': rng.choice(event_types, size=n_events, p=[0.85, 0.10, 0.05]),
+    })
+    df['weight'] = df['interaction_type'].map({'view': 1, 'addtocart': 3, 'transaction': 5})
+    return df
+
+
+def write_item_properties(raw_dir, n_items, seed=42):
+    """Write item property files for `load_items` into `raw_dir`."""
+    import csv
+
+    rnd = random.Random(seed)
+    for name, prop, values in (
+        ('item_properties_part1.csv', 'category', [f'cat_{i}' for i in range(1, 21)]),
+        ('item_properties_part2.csv', 'brand', [f'brand_{i}' for i in range(1, 51)]),
+    ):
+        with open(os.path.join(raw_dir, name), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['itemid', 'property', 'value'])
+            for i in range(1, n_items + 1):
+                writer.writerow([100000 + i, prop, rnd.choice(values)])
+
+
+def run_size(size, repeat=3, n_requests=200, seed=42):
+    """Benchmark every operation against one generated dataset size."""
+    import sample_data_loader
+    from sample_recommender import RecommenderSystem
+    import app as app_module
+    from backend.thumbnails import ThumbnailStore
+
+    n_users, n_items, n_events = SIZES[size]
+    events = synthetic_events(n_users, n_items, n_events, seed=seed)
+    rnd = random.Random(seed)
+    results = {'dataset': {'users': n_users, 'items': n_items, 'events': n_events}}
+
+    model = RecommenderSystem()
+    results['train'] = measure(lambda _: model.train(events), range(repeat))
+
+    known_users = model.users
+    user_calls = [rnd.choice(known_users) for _ in range(n_requests)]
+    results['recommend'] = measure(lambda u: model.recommend(u, top_k=6), user_calls)
+
+    known_items = model.items
+    session_calls = []
+    for _ in range(n_requests):
+        picked = rnd.sample(known_items, min(len(known_items), rnd.randint(1, 8)))
+        session_calls.append({it: rnd.uniform(0.1, 5.0) for it in picked})
+    results['recommend_for_session_with_weights'] = measure(
+        lambda w: model.recommend_for_session_with_weights(w, top_k=6), session_calls)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = os.path.join(tmp, 'raw')
+        os.makedirs(raw_dir)
+        write_item_properties(raw_dir, n_items, seed=seed)
+        # Warm the app on the demo data before RAW_PATH is redirected, with a
+        # throwaway DB so the tracked models/rec_cache.db is left alone, and
+        # thumbnails prefetched into tmp from an unreachable host (no network,
+        # nothing written to static/thumbs)
+        app_module.DB_PATH = os.path.join(tmp, 'rec_cache.db')
+        app_module.thumbnails = ThumbnailStore(os.path.join(tmp, 'thumbs'), upstream='http://127.0.0.1:9/{item_id}')
+        app_module.warm()
+        old_raw = sample_data_loader.RAW_PATH
+        sample_data_loader.RAW_PATH = raw_dir
+        try:
+            item_calls = [rnd.sample(known_items, min(6, len(known_items))) for _ in range(max(1, n_requests // 10))]
+            results['load_items'] = measure(
+                lambda ids: sample_data_loader.load_items(relevant_product_ids=ids), item_calls)
+            results.update(run_http(app_module, events, model, user_calls, session_calls, tmp, n_requests))
+        finally:
+            sample_data_loader.RAW_PATH = old_raw
+    results['dataset']['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def run_http(app_module, events, model, user_calls, session_calls, tmp, n_requests):
+    """Benchmark the Flask routes through the test client."""
+    # Point the app at the benchmark dataset (the DB is already a throwaway one)
+    app_module.init_db()
+    app_module.install(model, 'benchmark', events=events)
+    app_module.rec_cache.clear()
+    app_module.clear_response_cache()
+    app_module.app.config['TESTING'] = True
+    client = app_module.app.test_client()
+
+    def get(path):
+        res = client.get(path)
+        if res.status_code != 200:
+            raise RuntimeError(f'{path} returned {res.status_code}')
+
+    def clear_caches():
+        app_module.rec_cache.clear()
+        app_module.clear_response_cache()
+
+    results = {}
+    # First pass is all cache misses, second pass hits the in-memory LRU
+    results['http_get_recommendations_cold'] = measure(
+        lambda u: get(f'/get_recommendations/{u}'), sorted(set(user_calls)), reset=clear_caches)
+    # The cold pass's allocation replay cleared the caches; refill them (untimed)
+    for u in sorted(set(user_calls)):
+        get(f'/get_recommendations/{u}')
+    hits = REC_CACHE.value(tier='response', result='hit')
+    results['http_get_recommendations_warm'] = measure(
+        lambda u: get(f'/get_recommendations/{u}'), user_calls)
+    warm_calls = len(user_calls) + min(len(user_calls), MEMORY_CALLS)
+    if REC_CACHE.value(tier='response', result='hit') - hits != warm_calls:
+        raise RuntimeError('warm /get_recommendations pass missed the response cache')
+    results['http_cache_status'] = measure(lambda u: get(f'/cache_status/{u}'), user_calls)
+
+    client.post('/signin')
+
+    def session_round(weights):
+        for it in weights:
+            client.post('/session_event', json={'item_id': int(it), 'event': 'view'})
+        get('/get_session_recommendations')
+
+    results['http_session_event_and_recommend'] = measure(session_round, session_calls[:max(1, n_requests // 4)])
+    results['http_index'] = measure(lambda _: get('/'), range(max(1, n_requests // 10)))
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Return regressions where a metric grew by more than `threshold` (fraction)."""
+    regressions = []
+    for size, ops in current.get('sizes', {}).items():
+        base_ops = baseline.get('sizes', {}).get(size)
+        if not base_ops:
+            continue
+        for op, stats in ops.items():
+            base_stats = base_ops.get(op)
+            if not isinstance(stats, dict) or not isinstance(base_stats, dict) or op == 'dataset':
+                continue
+            for metric in COMPARED_METRICS:
+                new, old = stats.get(metric), base_stats.get(metric)
+                if new is None or not old:
+                    continue
+                change = (new - old) / old
+                if change > threshold:
+                    regressions.append({
+                        'size': size, 'op': op, 'metric': metric,
+                        'baseline': old, 'current': new, 'change': round(change, 4),
+                    })
+    return regressions
+
+
+def run_isolated(size, args):
+    """Run one size in a fresh interpreter so the process peak RSS is per dataset size."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), '--worker', size,
+           '--repeat', str(args.repeat), '--requests', str(args.requests), '--seed', str(args.seed)]
+    out = subprocess.run(cmd, cwd=str(ROOT), capture_output=True, text=True, check=True).stdout
+    # The worker prints its JSON result as the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='small,medium', help=f'comma separated, from {",".join(SIZES)}')
+    parser.add_argument('--repeat', type=int, default=3, help='training runs per size')
+    parser.add_argument('--requests', type=int, default=200, help='calls per latency measurement')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=str(DEFAULT_OUT))
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed fractional slowdown')
+    parser.add_argument('--in-process', action='store_true', help='do not spawn one process per size')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_size(args.worker, args.repeat, args.requests, args.seed)))
+        return 0
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f'unknown sizes: {", ".join(unknown)}')
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': {},
+    }
+    for size in sizes:
+        print(f'Benchmarking {size} {SIZES[size]}...')
+        if args.in_process:
+            report['sizes'][size] = run_size(size, args.repeat, args.requests, args.seed)
+        else:
+            report['sizes'][size] = run_isolated(size, args)
+        for op, stats in report['sizes'][size].items():
+            if op != 'dataset':
+                print(f"  {op:<40} wall={stats['wall_s']:.3f}s p50={stats['p50_ms']:.2f}ms "
+                      f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms alloc={stats['peak_alloc_mb']}MB")
+        print(f"  process peak RSS: {report['sizes'][size]['dataset']['peak_rss_mb']}MB")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print('Results written to', out)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print('Baseline saved to', baseline_path)
+        return 0
+
+    if not baseline_path.exists():
+        print('No baseline found; run with --save-baseline to create one.')
+        return 0
+
+    regressions = compare(report, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}:')
+        for r in regressions:
+            print(f"  [{r['size']}] {r['op']}.{r['metric']}: {r['baseline']} -> {r['current']} (+{r['change']:.0%})")
+        return 1
+    print('No regressions against baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# Build per-shard artifacts: users are partitioned by a hash of their id and
+# each shard gets its users' neighbour lists plus the interaction rows they use.
+# Usage: python scripts/build_shards.py --shards 4 --out models/shards
+#        (then run scripts/shard_workers.py and start the app with SHARD_DIR set)
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+logger = logging.getLogger('build_shards')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--out', default=os.path.join('models', 'shards'))
+    parser.add_argument('--neighbours', type=int, default=20, help='similar users kept per user')
+    parser.add_argument('--full', action='store_true', help='build from the full dataset loader')
+    parser.add_argument('--retrain', action='store_true', help='rebuild every pipeline stage instead of using cached ones')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    import numpy as np
+    import app as app_module
+    from backend.sharding import build_shards
+
+    pipeline = app_module.make_pipeline(use_full=args.full)
+    pipeline.rebuild = args.retrain
+    model = pipeline.build()
+    logger.info('Pipeline: %s', ', '.join(f'{k}={v}' for k, v in pipeline.report.items()))
+    meta = dict(pipeline.get('popularity'))
+    top = np.asarray(meta.pop('top_users'), dtype=np.int64)
+    meta.pop('top_items', None)
+    meta['use_full_dataset'] = args.full
+
+    start = time.perf_counter()
+    manifest = build_shards(model, args.out, args.shards, meta=meta,
+                            extra_arrays={'top_users': top}, neighbours=args.neighbours)
+    logger.info('Built %d shards for %d users in %.2fs (items version %s) under %s',
+                args.shards, len(model.users), time.perf_counter() - start, manifest['version'], args.out)
+
+
+if __name__ == '__main__':
+    main()
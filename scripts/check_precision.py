@@ -0,0 +1,77 @@
+# Accuracy/size check for reduced-precision model storage
+# Compares float32/float16/int8 models against the float64 reference: RAM and
+# artifact size, plus top-K overlap for user and session recommendations.
+# Usage: python scripts/check_precision.py --users 200 --k 6 --min-overlap 0.9
+import argparse
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sample_data_loader import load_events
+from sample_recommender import RecommenderSystem, PRECISIONS
+from metrics import top_k_overlap
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=200, help='users/sessions to compare')
+parser.add_argument('--k', type=int, default=6)
+parser.add_argument('--max-users', type=int, default=1000)
+parser.add_argument('--max-items', type=int, default=1000)
+parser.add_argument('--nrows', type=int, default=50000)
+parser.add_argument('--synthetic', help='use a generated dataset size from scripts/benchmark.py (e.g. medium)')
+parser.add_argument('--min-overlap', type=float, default=0.0, help='exit 1 if any mean overlap is below this')
+args = parser.parse_args()
+
+if args.synthetic:
+    from scripts.benchmark import SIZES, synthetic_events
+    events = synthetic_events(*SIZES[args.synthetic])
+else:
+    events = load_events(sample_frac=1.0, max_users=args.max_users, max_items=args.max_items, nrows=args.nrows)
+print(f"Events: {len(events)}")
+
+reference = RecommenderSystem(precision='float64')
+reference.train(events)
+rnd = random.Random(42)
+users = rnd.sample(reference.users, min(args.users, len(reference.users)))
+sessions = []
+for _ in range(args.users):
+    picked = rnd.sample(reference.items, min(len(reference.items), rnd.randint(1, 6)))
+    sessions.append({it: rnd.uniform(0.5, 5.0) for it in picked})
+
+ref_user = {u: reference.recommend(u, top_k=args.k) for u in users}
+ref_session = [reference.recommend_for_session_with_weights(w, top_k=args.k) for w in sessions]
+
+
+def artifact_bytes(model):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.joblib')
+        model.save(path)
+        return os.path.getsize(path)
+
+
+ref_ram = sum(reference.memory_usage().values())
+ref_disk = artifact_bytes(reference)
+print(f"{'precision':<10} {'RAM':>10} {'artifact':>10} {'RAM x':>7} {'user@k':>8} {'session@k':>10}")
+failed = False
+for precision in PRECISIONS:
+    model = RecommenderSystem(precision=precision)
+    model.train(events)
+    ram = sum(model.memory_usage().values())
+    disk = artifact_bytes(model)
+    user_overlap = sum(top_k_overlap(ref_user[u], model.recommend(u, top_k=args.k), args.k)
+                       for u in users) / max(1, len(users))
+    session_overlap = sum(top_k_overlap(ref, model.recommend_for_session_with_weights(w, top_k=args.k), args.k)
+                          for ref, w in zip(ref_session, sessions)) / max(1, len(sessions))
+    print(f"{precision:<10} {ram / 1024:>9.1f}K {disk / 1024:>9.1f}K {ref_ram / max(1, ram):>6.2f}x "
+          f"{user_overlap:>8.3f} {session_overlap:>10.3f}")
+    if min(user_overlap, session_overlap) < args.min_overlap:
+        failed = True
+
+if failed:
+    print(f"Overlap below {args.min_overlap} for at least one precision")
+sys.exit(1 if failed else 0)
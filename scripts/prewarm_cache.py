@@ -2,69 +2,55 @@
 # Usage: python scripts/prewarm_cache.py --top 50 --k 6
 import argparse
 import os
+from concurrent.futures import wait
 import sys
-import sqlite3
-import json
-import time
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
+# The app's data, pipeline and DB paths are relative to the repository root
+os.chdir(ROOT)
 
-from sample_data_loader import load_events, load_items
-from sample_recommender import RecommenderSystem
-import requests
+import app as app_module
+from backend.thumbnails import ThumbnailStore
 
-ROOT = Path(__file__).resolve().parents[1]
-DB_PATH = ROOT / 'models' / 'rec_cache.db'
 THUMB_DIR = ROOT / 'static' / 'thumbs'
 THUMB_DIR.mkdir(parents=True, exist_ok=True)
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--top', type=int, default=50)
 parser.add_argument('--k', type=int, default=6)
+parser.add_argument('--thumb-workers', type=int, default=8, help='concurrent thumbnail downloads')
 args = parser.parse_args()
 
-# Load events and train
-print('Loading events...')
-events = load_events(sample_frac=1.0, max_users=1000, max_items=1000, nrows=20000)
-print('Events:', len(events))
-model = RecommenderSystem()
-model.train(events)
-print('Model trained')
+# Build (or load) the model the app would serve, with the app's loader and
+# settings, so the rows below are stored under the version the app loads
+pipeline, model = app_module.train_pipeline()
+version = app_module.pipeline_version(pipeline)
+popularity = pipeline.get('popularity')
+print('Events:', popularity['events_count'])
+print('Model ready:', version, ', '.join(f'{stage}={state}' for stage, state in pipeline.report.items()))
 
 # Pick top users by activity
-top_users = events['user_id'].value_counts().nlargest(args.top).index.tolist()
+top_users = popularity['top_users'][:args.top]
 print('Top users:', len(top_users))
 
-# Ensure DB exists
-if not DB_PATH.parent.exists():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-conn = sqlite3.connect(DB_PATH)
-c = conn.cursor()
+app_module.init_db()
+thumbs = ThumbnailStore(str(THUMB_DIR), upstream=os.environ.get('THUMB_UPSTREAM'),
+                        max_workers=args.thumb_workers, max_pending=100000)
+pending = []
+rows = []
 
 for uid in top_users:
     recs = model.recommend(uid, top_k=args.k)
-    try:
-        c.execute('REPLACE INTO rec_cache (user_id, top_k, recs, ts) VALUES (?,?,?,?)',
-                  (int(uid), int(args.k), json.dumps(recs), time.time()))
-        conn.commit()
-    except Exception as e:
-        print('DB insert failed for', uid, e)
-    # Pre-download thumbnails for each recommended item
-    for item in recs:
-        img_path = THUMB_DIR / f"{item}.jpg"
-        if img_path.exists():
-            continue
-        try:
-            url = f"https://picsum.photos/seed/{item}/200/200"
-            r = requests.get(url, timeout=10)
-            if r.status_code == 200:
-                with open(img_path, 'wb') as f:
-                    f.write(r.content)
-        except Exception:
-            pass
-
-conn.close()
+    rows.append((uid, args.k, recs))
+    # Queue thumbnail downloads for each recommended item (fetched concurrently)
+    pending.extend(thumbs.prefetch(recs))
+
+app_module.persist_recommendations_many(rows, version)
+print('Persisted', len(rows), 'rows to', app_module.DB_PATH)
+if pending:
+    print('Waiting for', len(pending), 'thumbnail downloads...')
+    wait(pending)
+thumbs.shutdown()
 print('Prewarm complete.')
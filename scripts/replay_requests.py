@@ -0,0 +1,51 @@
+# Replay a captured request log against the app and report load-test stats
+# Capture: REQUEST_LOG_PATH=logs/requests.jsonl python app.py
+# Usage:   python scripts/replay_requests.py logs/requests.jsonl --concurrency 16
+#          python scripts/replay_requests.py logs/requests.jsonl --qps 200 --url http://127.0.0.1:5000
+#          python scripts/replay_requests.py logs/requests.jsonl --speed 2.0
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.request_log import load_log, replay, TestClientTarget, HTTPTarget
+
+parser = argparse.ArgumentParser()
+parser.add_argument('log', help='JSONL file written by the capture middleware')
+parser.add_argument('--url', help='replay against a running server instead of the Flask test client')
+parser.add_argument('--concurrency', type=int, default=8, help='concurrent sessions/requests in flight')
+parser.add_argument('--qps', type=float, help='target request rate across all workers')
+parser.add_argument('--speed', type=float, help='keep recorded timing, scaled by this factor')
+parser.add_argument('--limit', type=int, help='replay only the first N requests')
+parser.add_argument('--repeat', type=int, default=1, help='replay the log this many times')
+parser.add_argument('--json', action='store_true', help='print the report as JSON')
+args = parser.parse_args()
+
+entries = load_log(args.log, limit=args.limit)
+if not entries:
+    sys.exit(f'No requests found in {args.log}')
+
+if args.url:
+    target = HTTPTarget(args.url)
+else:
+    from app import app, warm
+    app.config['TESTING'] = True
+    # Load the model up front so startup is not counted as request latency
+    warm()
+    target = TestClientTarget(app)
+
+for i in range(args.repeat):
+    report = replay(entries, target, concurrency=args.concurrency, qps=args.qps, speed=args.speed)
+    if args.json:
+        print(json.dumps(report))
+        continue
+    print(f"Run {i + 1}: {report['requests']} requests ({report['sessions']} sessions) in {report['duration_s']}s")
+    print(f"  throughput: {report['throughput_rps']} req/s")
+    print(f"  latency:    p50={report['p50_ms']}ms p95={report['p95_ms']}ms p99={report['p99_ms']}ms")
+    print(f"  errors:     {report['error_rate']:.2%} (4xx {report['client_error_rate']:.2%})")
+    ratio = report['cache_hit_ratio']
+    print(f"  cache hits: {'n/a' if ratio is None else f'{ratio:.2%}'}")
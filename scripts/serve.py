@@ -0,0 +1,164 @@
+# Production-style serving: pre-fork workers sharing one memory-mapped model
+# Usage: python scripts/serve.py --workers 4 --port 5000
+#        kill -HUP <launcher pid>   # rebuild stale pipeline stages and publish the model to all workers
+# Stdlib + werkzeug only; falls back to a single process where fork is unavailable.
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+logger = logging.getLogger('serve')
+
+
+def publish_model(shared_dir, retrain=False, model_file=None):
+    """Build (or load) the model in the launcher and publish it for the workers.
+
+    Without `model_file` the model comes from the cached training pipeline,
+    which rebuilds only the stages whose inputs changed (`retrain` rebuilds all).
+    """
+    import numpy as np
+    import app as app_module
+    from sample_recommender import RecommenderSystem
+    from backend.shared_model import publish
+
+    pipeline = app_module.make_pipeline()
+    pipeline.rebuild = retrain
+    meta = dict(pipeline.get('popularity'))
+    if model_file:
+        model = RecommenderSystem(precision=app_module.MODEL_PRECISION)
+        model.load(model_file)
+    else:
+        model = pipeline.build()
+        logger.info('Pipeline: %s', ', '.join(f'{k}={v}' for k, v in pipeline.report.items()))
+        pipeline.export(app_module.MODEL_PATH)
+    top = np.asarray(meta.pop('top_users'), dtype=np.int64)
+    meta.pop('top_items', None)
+    meta['use_full_dataset'] = app_module.USE_FULL_DATASET
+    manifest = publish(model, shared_dir, extra_arrays={'top_users': top}, meta=meta)
+    logger.info('Published model version %s to %s', manifest['version'], shared_dir)
+    return manifest
+
+
+def run_worker(sock, host, port, threads):
+    """Serve on the inherited listening socket until terminated."""
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    app = create_app(warmup='sync')
+    server = make_server(host, port, app, threaded=threads, fd=sock.fileno())
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--no-threads', action='store_true', help='one request at a time per worker')
+    parser.add_argument('--shared-dir', help='where model arrays are published (default: /dev/shm or models/shared)')
+    parser.add_argument('--watch', type=float, default=0.0,
+                        help='seconds between checks of the model file for changes (0 disables)')
+    parser.add_argument('--retrain', action='store_true', help='rebuild every pipeline stage instead of using cached ones')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(message)s')
+
+    from backend.shared_model import shared_root
+    shared_dir = args.shared_dir or shared_root()
+    os.makedirs(shared_dir, exist_ok=True)
+    # Workers read this when `app` warms
+    os.environ['SHARED_MODEL_DIR'] = shared_dir
+    publish_model(shared_dir, retrain=args.retrain)
+
+    if not hasattr(os, 'fork'):
+        logger.warning('fork() not available; serving from a single process')
+        from app import create_app
+        create_app(warmup='sync').run(host=args.host, port=args.port, threaded=not args.no_threads)
+        return
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    children = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, args.host, args.port, not args.no_threads)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+        logger.info('Started worker %s', pid)
+
+    state = {'reload': False, 'stop': False}
+    signal.signal(signal.SIGHUP, lambda *_: state.update(reload=True))
+    signal.signal(signal.SIGTERM, lambda *_: state.update(stop=True))
+    signal.signal(signal.SIGINT, lambda *_: state.update(stop=True))
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+    logger.info('Serving on http://%s:%s with %d workers', args.host, args.port, len(children))
+
+    import app as app_module
+    model_mtime = os.path.getmtime(app_module.MODEL_PATH) if os.path.exists(app_module.MODEL_PATH) else None
+    next_watch = time.time() + args.watch if args.watch else None
+    while not state['stop']:
+        # Reap and replace crashed workers
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in children:
+            logger.warning('Worker %s exited; restarting', pid)
+            children.pop(pid)
+            spawn()
+
+        if next_watch and time.time() >= next_watch:
+            next_watch = time.time() + args.watch
+            mtime = os.path.getmtime(app_module.MODEL_PATH) if os.path.exists(app_module.MODEL_PATH) else None
+            if mtime != model_mtime:
+                state['reload'] = state['reload'] or 'file'
+
+        if state['reload']:
+            # SIGHUP rebuilds from the data (cached stages make this cheap when
+            # nothing changed); a hand-saved model file is published as-is
+            model_file = app_module.MODEL_PATH if state['reload'] == 'file' else None
+            state['reload'] = False
+            try:
+                # Workers notice the new manifest on their next request and re-attach
+                publish_model(shared_dir, model_file=model_file)
+                model_mtime = os.path.getmtime(app_module.MODEL_PATH)
+            except Exception:
+                logger.exception('Reload failed; workers keep the current version')
+        time.sleep(0.2)
+
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in list(children):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    logger.info('Stopped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Run one worker process per shard built by scripts/build_shards.py.
+# Usage: python scripts/shard_workers.py --shard-dir models/shards
+#        SHARD_DIR=models/shards python app.py
+# Workers listen on unix sockets under the shard dir by default (named pipes
+# on Windows); --tcp host:port gives shard i the port port+i instead (only on
+# loopback unless SHARD_AUTHKEY is set explicitly on both sides). Crashed
+# workers are restarted; rebuilt shards are picked up without a restart.
+import argparse
+import ipaddress
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+logger = logging.getLogger('shard_workers')
+
+
+def run_shard(root, index, address, authkey):
+    from backend.sharding import ShardServer
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(message)s')
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ShardServer(root, index, address=address, authkey=authkey).serve_forever()
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard-dir', default=os.path.join('models', 'shards'))
+    parser.add_argument('--tcp', help='host:port of shard 0; shard i listens on port + i')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(message)s')
+
+    from backend.sharding import ITEMS_DIR, shard_address, shard_authkey
+    from backend.shared_model import read_manifest
+
+    manifest = read_manifest(os.path.join(args.shard_dir, ITEMS_DIR))
+    if manifest is None:
+        sys.exit(f'No shards under {args.shard_dir}; run scripts/build_shards.py first')
+    n_shards = manifest['meta']['n_shards']
+    authkey = shard_authkey(args.shard_dir)
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(':')
+        host = host or '127.0.0.1'
+        # Messages are pickles: a reachable listener with a guessable key is remote code execution
+        if not is_loopback(host) and not os.environ.get('SHARD_AUTHKEY'):
+            sys.exit(f'Refusing to listen on {host}: set SHARD_AUTHKEY to a secret shared with the app')
+        addresses = [(host, int(port) + i) for i in range(n_shards)]
+    else:
+        addresses = [shard_address(args.shard_dir, i) for i in range(n_shards)]
+
+    workers = {}
+
+    def spawn(index):
+        proc = multiprocessing.Process(target=run_shard, name=f'shard-{index}',
+                                       args=(args.shard_dir, index, addresses[index], authkey), daemon=True)
+        proc.start()
+        workers[index] = proc
+        logger.info('Started shard %d (pid %s) on %s', index, proc.pid, addresses[index])
+
+    state = {'stop': False}
+    signal.signal(signal.SIGTERM, lambda *_: state.update(stop=True))
+    signal.signal(signal.SIGINT, lambda *_: state.update(stop=True))
+
+    for index in range(n_shards):
+        spawn(index)
+    if args.tcp:
+        logger.info('Start the app with SHARD_DIR=%s SHARD_ADDRESSES=%s', args.shard_dir,
+                    ','.join(f'{h}:{p}' for h, p in addresses))
+    while not state['stop']:
+        # Reap and replace crashed workers
+        for index, proc in list(workers.items()):
+            if not proc.is_alive():
+                logger.warning('Shard %d exited with %s; restarting', index, proc.exitcode)
+                spawn(index)
+        time.sleep(0.5)
+
+    for proc in workers.values():
+        proc.terminate()
+    for proc in workers.values():
+        proc.join(5)
+    logger.info('Stopped %d shard workers', len(workers))
+
+
+if __name__ == '__main__':
+    main()
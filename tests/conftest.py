@@ -0,0 +1,27 @@
+import pytest
+
+
+# Port 9 (discard) refuses connections, so prefetches fail fast and offline
+UNREACHABLE_UPSTREAM = 'http://127.0.0.1:9/{item_id}'
+
+
+@pytest.fixture(autouse=True, scope='session')
+def scratch_rec_cache_db(tmp_path_factory):
+    """Keep the app's SQLite cache out of the tracked models/rec_cache.db."""
+    import app as app_module
+    original = app_module.DB_PATH
+    app_module.DB_PATH = str(tmp_path_factory.mktemp('db') / 'rec_cache.db')
+    yield
+    app_module.DB_PATH = original
+
+
+@pytest.fixture(autouse=True, scope='session')
+def scratch_thumbnails(tmp_path_factory):
+    """Keep thumbnail prefetches off the network and out of static/thumbs."""
+    import app as app_module
+    from backend.thumbnails import ThumbnailStore
+    original = app_module.thumbnails
+    app_module.thumbnails = ThumbnailStore(str(tmp_path_factory.mktemp('thumbs')), upstream=UNREACHABLE_UPSTREAM)
+    yield
+    app_module.thumbnails.shutdown(wait=False)
+    app_module.thumbnails = original
@@ -1,5 +1,5 @@
 import pytest
-from app import app, MODEL_PATH
+from app import app
 from sample_data_loader import load_events
 
 @pytest.fixture
@@ -34,4 +34,99 @@ def test_get_recs_and_cache_endpoints(client):
     assert res3.status_code == 200
     js3 = res3.get_json()
     assert 'recs' in js3
-*** End Patch
\ No newline at end of file
+
+
+def test_metrics_endpoint(client):
+    client.get('/')
+    res = client.get('/metrics')
+    assert res.status_code == 200
+    assert res.content_type.startswith('text/plain')
+    assert 'http_requests_total{route="/",method="GET",status="200"}' in res.get_data(as_text=True)
+
+
+def test_health_and_readiness(client):
+    assert client.get('/healthz').status_code == 200
+    client.get('/')  # the first gated request warms the app in testing mode
+    res = client.get('/readyz')
+    assert res.status_code == 200
+    assert res.get_json()['ready'] is True
+
+
+def test_recommendations_etag_and_304(client):
+    events = load_events(sample_frac=0.2, max_users=10, max_items=20, nrows=2000)
+    if events.empty:
+        pytest.skip('no events')
+    user = int(events['user_id'].iloc[0])
+    first = client.get(f'/get_recommendations/{user}')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    second = client.get(f'/get_recommendations/{user}')
+    assert second.headers['X-Cache'] == 'hit'
+    assert second.get_data() == first.get_data()
+    assert second.headers['ETag'] == etag
+    not_modified = client.get(f'/get_recommendations/{user}', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b''
+
+
+def test_db_cache_loads_only_rows_of_current_model(client, tmp_path, monkeypatch):
+    import sqlite3
+    import app as app_module
+    client.get('/')  # warm
+    monkeypatch.setattr(app_module, 'DB_PATH', str(tmp_path / 'rec_cache.db'))
+    # A table from before rows carried a model version is migrated in place
+    conn = sqlite3.connect(app_module.DB_PATH)
+    conn.execute('CREATE TABLE rec_cache (user_id INTEGER, top_k INTEGER, recs TEXT, ts REAL, '
+                 'PRIMARY KEY (user_id, top_k))')
+    conn.execute("INSERT INTO rec_cache VALUES (-3, 3, '[7]', strftime('%s','now'))")
+    conn.commit()
+    conn.close()
+    app_module.init_db()
+
+    version = app_module.state.version
+    app_module.persist_recommendations(-1, 3, [1, 2, 3], version)
+    app_module.persist_recommendations(-2, 3, [4, 5, 6], 'some-older-model')
+    app_module.rec_cache.clear()
+    app_module.load_db_cache()
+    assert app_module.rec_cache.get((-1, 3, version)) == [1, 2, 3]
+    assert app_module.rec_cache.get((-2, 3, version)) is None
+    assert app_module.rec_cache.get((-3, 3, version)) is None
+
+
+def test_k_is_bounded(client):
+    import app as app_module
+    client.get('/')  # warm
+    user = int(app_module.state.meta['top_users'][0])
+    res = client.get(f'/get_recommendations/{user}?k=1000000')
+    assert res.status_code == 200
+    # Scored, cached and tracked as k=MAX_K
+    assert (user, app_module.MAX_K) in app_module.access_tracker.last_seen
+    res = client.post('/get_recommendations_batch', json={'user_ids': [user], 'k': app_module.MAX_K + 1})
+    assert res.status_code == 400
+
+
+def test_batch_rejects_booleans(client):
+    for body in ({'user_ids': [True], 'k': 6}, {'user_ids': [1], 'k': True}):
+        assert client.post('/get_recommendations_batch', json=body).status_code == 400
+
+
+def test_prewarmed_user_gets_a_rendered_hit(client):
+    import app as app_module
+    client.get('/')  # warm
+    user = int(app_module.state.meta['top_users'][0])
+    app_module.rec_cache.clear()
+    app_module.clear_response_cache()
+    for _ in range(3):
+        app_module.access_tracker.record((user, 6))
+    assert app_module.prewarmer.run_once() >= 1
+    res = client.get(f'/get_recommendations/{user}')
+    assert res.headers['X-Cache'] == 'hit'
+    assert res.get_json()
+
+
+def test_prewarm_top_users_clamps_n(client, monkeypatch):
+    import app as app_module
+    client.get('/')  # warm
+    assert client.post('/prewarm_top_users?n=-1').get_json()['n'] == 0
+    monkeypatch.setattr(app_module, 'PREWARM_TOP_MAX', 2)
+    assert client.post('/prewarm_top_users?n=100000').get_json()['n'] == 2
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend.batching import Coalescer
+from sample_recommender import top_k_indices
+
+
+def test_concurrent_calls_share_batches():
+    calls = []
+
+    def score(context, items):
+        calls.append(list(items))
+        time.sleep(0.01)
+        return {i: (context, i * 2) for i in items}
+
+    batcher = Coalescer(score, max_batch=8, max_wait=0.05)
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.submit('k', i % 12, context='ctx')
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(24)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: ('ctx', (i % 12) * 2) for i in range(24)}
+    # Fewer model calls than requests, none above max_batch, duplicates scored once
+    assert len(calls) < 24
+    assert all(len(c) <= 8 and len(c) == len(set(c)) for c in calls)
+
+
+def test_lone_call_does_not_wait_and_errors_propagate():
+    def score(context, items):
+        if -1 in items:
+            raise ValueError('bad item')
+        return {i: i for i in items}
+
+    batcher = Coalescer(score, max_wait=1.0)
+    started = time.perf_counter()
+    assert batcher.submit('k', 3) == 3
+    assert time.perf_counter() - started < 0.5
+    with pytest.raises(ValueError):
+        batcher.submit('k', -1)
+    assert Coalescer(score, max_wait=0).submit('k', 4) == 4
+
+
+def test_top_k_indices_matches_stable_argsort():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        scores = rng.integers(0, 4, size=(5, int(rng.integers(1, 40)))).astype(float)
+        k = int(rng.integers(0, 45))
+        expected = np.argsort(scores, axis=1, kind='stable')[:, ::-1][:, :k]
+        assert (top_k_indices(scores, k) == expected).all()
+        assert (top_k_indices(scores[0], k) == expected[0]).all()
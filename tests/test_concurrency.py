@@ -0,0 +1,88 @@
+import threading
+
+import app as app_module
+from backend.cache import StripedLRU
+from sample_recommender import RecommenderSystem
+
+
+def test_striped_lru_bounded_under_threads():
+    cache = StripedLRU(64, stripes=8)
+
+    def worker(offset):
+        for i in range(2000):
+            key = (offset, i % 100)
+            cache.set(key, i)
+            cache.get((offset, (i * 7) % 100))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(cache) <= 64
+    cache.discard_where(lambda key: key[0] == 0)
+    assert all(key[0] != 0 for key in cache.keys())
+
+
+def test_routes_under_load_during_model_swaps():
+    app_module.app.config['TESTING'] = True
+    assert app_module.warm()
+    original = app_module.state
+    # A second model with the same users so every route keeps working across swaps
+    alternate = RecommenderSystem(precision='float32')
+    alternate.from_arrays(original.model.to_arrays())
+    alternate.set_precision('float32')
+    users = original.model.users[:10]
+    items = original.model.items[:5]
+    errors = []
+    stop = threading.Event()
+
+    def hammer(worker):
+        client = app_module.app.test_client()
+        client.post('/signin')
+        try:
+            for i in range(20):
+                user = users[(worker + i) % len(users)]
+                responses = [
+                    client.get(f'/get_recommendations/{user}?k={5 + i % 2}'),
+                    client.post('/session_event', json={'item_id': items[i % len(items)], 'event': 'view'}),
+                    client.get('/get_session_recommendations'),
+                    client.get('/loader_status'),
+                ]
+                if i % 10 == 0:
+                    responses.append(client.post(f'/refresh_recs/{user}'))
+                for res in responses:
+                    if res.status_code != 200:
+                        errors.append((res.request.path, res.status_code))
+        except Exception as e:  # pragma: no cover - surfaced by the assert below
+            errors.append(repr(e))
+
+    def swapper():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            model = alternate if n % 2 else original.model
+            app_module.install(model, f'stress-{n}', meta=original.meta)
+            stop.wait(0.005)
+
+    workers = [threading.Thread(target=hammer, args=(w,)) for w in range(8)]
+    swap_thread = threading.Thread(target=swapper)
+    swap_thread.start()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    stop.set()
+    swap_thread.join()
+
+    try:
+        assert errors == []
+        # After the dust settles, cached answers match the installed model
+        snap = app_module.state
+        client = app_module.app.test_client()
+        for user in users:
+            ids = [r['id'] for r in client.get(f'/get_recommendations/{user}').get_json()]
+            assert ids == snap.model.recommend(user, top_k=6)
+    finally:
+        app_module.install(original.model, original.version, events=original.events,
+                           meta=original.meta, use_full=original.use_full)
@@ -0,0 +1,57 @@
+import pandas as pd
+from backend.cooccurrence import SpaceSaving, CooccurrenceBuilder, build_cooccurrence
+from sample_recommender import RecommenderSystem
+
+
+def test_space_saving_is_bounded_and_keeps_heavy_hitters():
+    ss = SpaceSaving(3)
+    for key in ['a'] * 10 + ['b'] * 5 + list('cdef'):
+        ss.add(key)
+    assert len(ss.counts) == 3
+    assert [k for k, _ in ss.top(2)] == ['a', 'b']
+
+
+def test_window_and_transaction_pairs():
+    builder = CooccurrenceBuilder(window_s=60, per_item=5, max_visitors=2)
+    builder.add(0, 1, 10)
+    builder.add(30_000, 1, 11)           # same visitor within the window
+    builder.add(500_000, 1, 12)          # outside the window of both
+    builder.add(0, 2, 20, 'tx1')
+    builder.add(0, 3, 21, 'tx1')         # same transaction, other visitor
+    for v in range(4, 10):               # visitor state stays capped
+        builder.add(0, v, 30)
+    assert len(builder._visitors) == 2
+    assert dict(builder.counters[10].top()) == {11: 1.0}
+    assert 12 not in builder.counters
+    assert dict(builder.counters[20].top()) == {21: 3.0}
+
+
+def test_blend_into_session_scores():
+    events = pd.DataFrame({
+        'timestamp': [0, 1000, 2000, 3000, 0, 1000],
+        'user_id': [1, 1, 2, 2, 3, 3],
+        'product_id': [100, 101, 100, 101, 102, 103],
+        'weight': [1, 1, 1, 1, 1, 1],
+    })
+    model = RecommenderSystem()
+    model.train(events)
+    model.set_cooccurrence(build_cooccurrence(events, window_s=60))
+    assert model.recommend_for_session_with_weights({100: 1.0}, top_k=1, cooc_blend=1.0) == [101]
+    # Saved artifacts keep the co-occurrence arrays
+    arrays = model.to_arrays()
+    assert 'cooc_neighbors' in arrays
+
+
+def test_chunks_are_paired_in_time_order():
+    # One visitor's events out of time order, as in events.csv; with a
+    # history of 1 only time-adjacent items may pair
+    events = pd.DataFrame({
+        'timestamp': [1000, 3000, 2000],
+        'user_id': [1, 1, 1],
+        'product_id': [10, 12, 11],
+    })
+    cooc = build_cooccurrence(events, window_s=60, history=1)
+    pairs = {(int(a), int(b)) for a, start, end in zip(cooc['cooc_items'], cooc['cooc_indptr'][:-1],
+                                                         cooc['cooc_indptr'][1:])
+             for b in cooc['cooc_neighbors'][start:end]}
+    assert pairs == {(10, 11), (11, 10), (11, 12), (12, 11)}
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+import backend.data_loader as data_loader
+from backend.data_loader import EventStream, load_events_filtered
+from sample_recommender import build_user_item_matrix
+
+EVENTS = 'data/raw/events.csv'
+
+
+def _expected(max_users=None, max_items=None, min_user_events=1, min_item_events=1, start=None, end=None):
+    """In-memory version of the streaming filters (ties go to the smaller id)."""
+    df = pd.read_csv(EVENTS)
+    df = df[df['event'].isin(data_loader.EVENT_WEIGHTS)]
+    if start is not None:
+        df = df[df['timestamp'] >= start]
+    if end is not None:
+        df = df[df['timestamp'] < end]
+
+    def pick(column, top, min_count):
+        counts = df[column].value_counts()
+        counts = counts[counts >= min_count].reset_index()
+        counts.columns = ['id', 'n']
+        counts = counts.sort_values(['n', 'id'], ascending=[False, True])
+        return set(counts['id'][:top] if top is not None else counts['id'])
+
+    users = pick('visitorid', max_users, min_user_events)
+    items = pick('itemid', max_items, min_item_events)
+    return df[df['visitorid'].isin(users) & df['itemid'].isin(items)]
+
+
+def test_stream_filters_match_in_memory_filtering():
+    cases = [
+        {'max_users': 30, 'max_items': 40},
+        {'min_user_events': 5, 'min_item_events': 3},
+        {'max_items': 50, 'start': 1766000000000, 'end': 1767000000000},
+    ]
+    for filters in cases:
+        stream = EventStream(chunksize=700, **filters)
+        chunks = list(stream)
+        assert len(chunks) > 1
+        got = pd.concat(chunks, ignore_index=True)
+        expected = _expected(**filters)
+        assert len(got) == len(expected) == stream.rows_selected
+        assert sorted(got['user_id']) == sorted(expected['visitorid'])
+        assert sorted(got['product_id']) == sorted(expected['itemid'])
+        assert got['weight'].sum() == expected['event'].map(data_loader.EVENT_WEIGHTS).sum()
+    assert got['user_id'].dtype == np.int32
+    assert isinstance(got['interaction_type'].dtype, pd.CategoricalDtype)
+
+
+def test_chunks_build_the_same_matrix():
+    stream = EventStream(max_users=40, max_items=40, chunksize=500)
+    frame = load_events_filtered(max_users=40, max_items=40)
+    expected = build_user_item_matrix(frame)
+    got = build_user_item_matrix(stream)
+    assert (got.index == expected.index).all() and (got.columns == expected.columns).all()
+    assert np.array_equal(got.values, expected.values)
+
+    decayed = build_user_item_matrix(stream, half_life=5 * 86400)
+    reference = build_user_item_matrix(frame, half_life=5 * 86400, now=stream.newest)
+    assert np.allclose(decayed.values, reference.values)
@@ -0,0 +1,21 @@
+from backend.instrumentation import Registry
+
+
+def test_counter_and_histogram_render():
+    reg = Registry()
+    hits = reg.counter('cache_total', 'Cache lookups.', ('result',))
+    hits.inc(result='hit')
+    hits.inc(2, result='miss')
+    lat = reg.histogram('op_seconds', 'Op latency.', ('op',), buckets=(0.1, 1.0))
+    lat.observe(0.05, op='a')
+    lat.observe(0.5, op='a')
+    lat.observe(5.0, op='a')
+
+    text = reg.render()
+    assert '# TYPE cache_total counter' in text
+    assert 'cache_total{result="miss"} 2' in text
+    assert 'op_seconds_bucket{op="a",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{op="a",le="1.0"} 2' in text
+    assert 'op_seconds_bucket{op="a",le="+Inf"} 3' in text
+    assert 'op_seconds_count{op="a"} 3' in text
+    assert lat.count(op='a') == 3
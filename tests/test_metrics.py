@@ -8,3 +8,9 @@ def test_precision_and_recall():
     r = recall_at_k(true, pred, k=3)
     assert pytest.approx(p, rel=1e-3) == 2/3
     assert pytest.approx(r, rel=1e-3) == 2/3
+
+
+def test_top_k_overlap():
+    from metrics import top_k_overlap
+    assert top_k_overlap([1, 2, 3], [3, 2, 9], k=3) == pytest.approx(2 / 3)
+    assert top_k_overlap([], [1], k=3) == 1.0
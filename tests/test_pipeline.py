@@ -0,0 +1,66 @@
+import os
+import shutil
+import time
+
+import sample_data_loader
+from backend.pipeline import TrainingPipeline
+
+PARAMS = {'sample_frac': 1.0, 'max_users': 30, 'max_items': 40, 'nrows': 3000}
+
+
+def test_stages_are_cached_by_content(tmp_path, monkeypatch):
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    shutil.copy('data/raw/events.csv', raw / 'events.csv')
+    monkeypatch.setattr(sample_data_loader, 'RAW_PATH', str(raw))
+    cache = str(tmp_path / 'cache')
+
+    first = TrainingPipeline(cache, loader_params=PARAMS)
+    model = first.build()
+    assert set(first.report.values()) == {'built'}
+
+    # Unchanged data: the artifact is loaded without touching earlier stages
+    again = TrainingPipeline(cache, loader_params=PARAMS)
+    cached = again.build()
+    assert again.report == {'artifact': 'cached'}
+    user = model.users[0]
+    assert cached.recommend(user, top_k=5) == model.recommend(user, top_k=5)
+
+    # A new precision reuses the float64 similarities
+    int8 = TrainingPipeline(cache, loader_params=PARAMS, precision='int8')
+    int8.build()
+    assert int8.report == {'matrix': 'cached', 'similarities': 'cached', 'artifact': 'built'}
+
+    # Changed data invalidates everything downstream of ingest
+    with open(raw / 'events.csv', 'a', encoding='utf-8') as f:
+        f.write('1433221332117,257597,view,355908,\n')
+    changed = TrainingPipeline(cache, loader_params=PARAMS)
+    changed.build()
+    assert changed.key('ingest') != first.key('ingest')
+    assert changed.report['ingest'] == 'built'
+
+    target = tmp_path / 'model.joblib'
+    changed.export(str(target))
+    assert target.exists()
+
+
+def test_prune_keeps_recently_loaded_artifacts(tmp_path, monkeypatch):
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    shutil.copy('data/raw/events.csv', raw / 'events.csv')
+    monkeypatch.setattr(sample_data_loader, 'RAW_PATH', str(raw))
+    cache = str(tmp_path / 'cache')
+
+    def build(precision):
+        time.sleep(0.05)  # mtimes have coarse resolution
+        pipeline = TrainingPipeline(cache, loader_params=PARAMS, precision=precision, keep=2)
+        pipeline.build()
+        return pipeline
+
+    in_use = build('float64')
+    other = build('float32')
+    # Reusing the older artifact makes it the most recent one
+    assert build('float64').report == {'artifact': 'cached'}
+    build('int8')
+    assert os.path.exists(in_use.path('artifact'))
+    assert not os.path.exists(other.path('artifact'))
@@ -0,0 +1,57 @@
+from backend.prewarm import AccessTracker, DecayedCountMin, Prewarmer
+
+
+def test_decayed_sketch_halves_per_half_life():
+    sketch = DecayedCountMin(width=256, depth=4, half_life=10.0)
+    for _ in range(8):
+        sketch.add('a', now=sketch.t0)
+    assert abs(sketch.estimate('a', now=sketch.t0) - 8) < 1e-9
+    assert abs(sketch.estimate('a', now=sketch.t0 + 10) - 4) < 1e-9
+    assert sketch.estimate('never', now=sketch.t0) <= 8
+
+
+def test_prewarmer_warms_only_returning_users_in_batches():
+    tracker = AccessTracker(half_life=3600)
+    t = tracker.sketch.t0
+    for _ in range(3):
+        tracker.record((1, 6), now=t)
+        tracker.record((2, 6), now=t)
+    tracker.record((3, 6), now=t)  # seen once: not worth warming
+    cache, batches = set(), []
+
+    def warm_batch(keys):
+        batches.append(list(keys))
+        cache.update(keys)
+
+    prewarmer = Prewarmer(tracker, warm_batch, cache.__contains__, batch_size=1, cpu_budget=1.0)
+    assert prewarmer.run_once(now=t) == 2
+    assert batches == [[(1, 6)], [(2, 6)]]
+    # Still cached and fresh: nothing to do
+    assert prewarmer.run_once(now=t) == 0
+    # After a model swap the cache is empty again
+    cache.clear()
+    prewarmer.kick()
+    assert prewarmer.run_once(now=t) == 2
+
+
+def test_status_is_read_only_and_compaction_is_bounded():
+    tracker = AccessTracker(capacity=4, half_life=3600)
+    t = tracker.sketch.t0
+    for user in range(8):
+        for _ in range(user + 1):
+            tracker.record((user, 6), now=t)
+    # Over capacity but under the inline limit: left for the prewarm loop
+    assert len(tracker) == 8
+    warmed = []
+    prewarmer = Prewarmer(tracker, warmed.extend, lambda key: False, hot_size=3, cpu_budget=1.0)
+    assert prewarmer.pending_count(now=t) == 3
+    assert prewarmer.pending_count(now=t) == 3
+    assert warmed == [] and len(tracker) == 8
+    assert prewarmer.run_once(now=t) == 3
+    assert warmed == [(7, 6), (6, 6), (5, 6)]
+    assert len(tracker) == 4
+    assert tracker.hot(10, now=t) == [(7, 6), (6, 6), (5, 6), (4, 6)]
+    # Far over capacity, record compacts on its own
+    for user in range(100, 106):
+        tracker.record((user, 6), now=t)
+    assert len(tracker) <= 8
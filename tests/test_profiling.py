@@ -0,0 +1,39 @@
+import pstats
+from flask import Flask, jsonify
+from backend.profiling import RequestProfiler
+
+
+def make_app(out_dir, mode):
+    app = Flask(__name__)
+    RequestProfiler(str(out_dir), allow_header=True, mode=mode, interval=0.001).init_app(app)
+
+    @app.route('/work/<int:n>')
+    def work(n):
+        return jsonify(sum(i * i for i in range(n)))
+
+    return app
+
+
+def test_cprofile_only_profiles_flagged_requests(tmp_path):
+    client = make_app(tmp_path, 'cprofile').test_client()
+    client.get('/work/10')
+    assert not list(tmp_path.iterdir())
+
+    client.get('/work/1000', headers={'X-Profile': '1'})
+    client.get('/work/1000', headers={'X-Profile': '1'})
+    listing = client.get('/profiles').get_json()
+    assert listing['routes']['/work/<int:n>']['requests'] == 2
+
+    res = client.get('/profiles/work_int_n')
+    assert res.status_code == 200
+    stats = pstats.Stats(str(tmp_path / 'work_int_n.pstats'))
+    assert stats.total_calls > 0
+
+
+def test_sampler_writes_collapsed_stacks(tmp_path):
+    client = make_app(tmp_path, 'sample').test_client()
+    client.get('/work/2000000', headers={'X-Profile': '1'})
+    text = (tmp_path / 'work_int_n.collapsed').read_text()
+    line = text.splitlines()[0]
+    stack, count = line.rsplit(' ', 1)
+    assert 'work (' in stack and int(count) > 0
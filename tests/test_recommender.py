@@ -13,4 +13,34 @@ def test_train_and_recommend():
         uid = users[0]
         recs = model.recommend(uid, top_k=3)
         assert isinstance(recs, list)
-*** End Patch
\ No newline at end of file
+
+
+def test_reduced_precision_matches_reference(tmp_path):
+    from metrics import top_k_overlap
+    df = load_events(sample_frac=1.0, max_users=50, max_items=50, nrows=5000)
+    reference = RecommenderSystem()
+    reference.train(df)
+    for precision in ('float32', 'float16', 'int8'):
+        model = RecommenderSystem(precision=precision)
+        model.train(df)
+        assert sum(model.memory_usage().values()) < sum(reference.memory_usage().values())
+        overlaps = [top_k_overlap(reference.recommend(u, top_k=5), model.recommend(u, top_k=5), 5)
+                    for u in reference.users]
+        assert sum(overlaps) / len(overlaps) > 0.8
+
+    # Saved int8 artifacts load back with their scales
+    path = str(tmp_path / 'int8.joblib')
+    model.save(path)
+    loaded = RecommenderSystem(precision='int8')
+    loaded.load(path)
+    uid = reference.users[0]
+    assert loaded.recommend(uid, top_k=5) == model.recommend(uid, top_k=5)
+
+
+def test_recommend_batch_matches_recommend():
+    df = load_events(sample_frac=1.0, max_users=50, max_items=50, nrows=5000)
+    model = RecommenderSystem()
+    model.train(df)
+    batch = model.recommend_batch(model.users + [-1], top_k=5)
+    assert batch[-1] == []
+    assert all(batch[u] == model.recommend(u, top_k=5) for u in model.users)
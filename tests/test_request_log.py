@@ -0,0 +1,40 @@
+from flask import Flask, jsonify, session
+from backend.request_log import RequestCapture, load_log, replay, TestClientTarget
+
+
+def make_app(log_path):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    RequestCapture(str(log_path)).init_app(app)
+
+    @app.route('/signin', methods=['POST'])
+    def signin():
+        session['sid'] = 'abc'
+        return jsonify({'status': 'signed_in'})
+
+    @app.route('/recs/<int:user_id>')
+    def recs(user_id):
+        res = jsonify([user_id])
+        res.headers['X-Cache'] = 'hit' if user_id % 2 else 'miss'
+        return res
+
+    return app
+
+
+def test_capture_and_replay(tmp_path):
+    log_path = tmp_path / 'requests.jsonl'
+    app = make_app(log_path)
+    client = app.test_client()
+    client.post('/signin')
+    client.get('/recs/1?k=3')
+    client.get('/recs/2')
+
+    entries = load_log(log_path)
+    assert [e['path'] for e in entries] == ['/signin', '/recs/1', '/recs/2']
+    assert entries[1]['query'] == 'k=3'
+    assert all(e['sid'] == 'abc' for e in entries)
+
+    report = replay(entries, TestClientTarget(app), concurrency=2)
+    assert report['requests'] == 3
+    assert report['error_rate'] == 0.0
+    assert report['cache_hit_ratio'] == 0.5
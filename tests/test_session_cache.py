@@ -0,0 +1,48 @@
+import math
+
+import app as app_module
+from backend.cache import StripedLRU
+from backend.instrumentation import REC_CACHE
+from backend.session_cache import session_fingerprint, representative_weights, entry_size
+
+
+def test_fingerprint_ignores_scale_and_uniform_decay():
+    weights = {30: 2.0, 10: 1.0, 20: 3.0}
+    decayed = {item: w * math.exp(-0.01 * 120) for item, w in weights.items()}
+    fp = session_fingerprint(weights, 0.1)
+    assert [item for item, _ in fp] == [10, 20, 30]
+    assert session_fingerprint(decayed, 0.1) == fp
+    # A shift below the tolerance keeps the key; a large one changes it
+    assert session_fingerprint({**weights, 10: 0.99}, 0.1) == fp
+    assert session_fingerprint({**weights, 10: 2.0}, 0.1) != fp
+    rep = representative_weights(fp, 0.1)
+    for item, w in weights.items():
+        assert abs(math.log(rep[item] / (w / 3.0))) <= math.log1p(0.1) / 2 + 1e-9
+
+
+def test_striped_lru_byte_budget():
+    cache = StripedLRU(10 ** 6, stripes=4, max_bytes=20_000, sizeof=entry_size)
+    for i in range(2000):
+        cache.set((i, tuple(range(10))), list(range(6)))
+    assert 0 < cache.nbytes() <= 20_000
+    assert len(cache) < 2000
+    cache.clear()
+    assert cache.nbytes() == 0 and len(cache) == 0
+
+
+def test_sessions_share_cached_results():
+    app_module.app.config['TESTING'] = True
+    assert app_module.warm()
+    app_module.session_cache.clear()
+    items = app_module.state.model.items[:3]
+    clients = [app_module.app.test_client() for _ in range(2)]
+    for client in clients:
+        client.post('/signin')
+        for item in items:
+            client.post('/session_event', json={'item_id': item, 'event': 'view'})
+    hits = REC_CACHE.value(tier='session', result='hit')
+    first = clients[0].get('/get_session_recommendations').get_json()
+    # The same visitor polling again, and another visitor with the same items
+    assert clients[0].get('/get_session_recommendations').get_json() == first
+    assert clients[1].get('/get_session_recommendations').get_json() == first
+    assert REC_CACHE.value(tier='session', result='hit') - hits == 2
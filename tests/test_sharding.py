@@ -0,0 +1,80 @@
+import os
+import stat
+import threading
+
+import pytest
+
+import app as app_module
+from sample_data_loader import load_events
+from sample_recommender import RecommenderSystem
+from backend.sharding import (
+    build_shards, attach_sharded, shard_of, partition, shard_address, shard_authkey,
+    ShardServer, ShardRouter, ShardUnavailable,
+)
+
+
+@pytest.fixture
+def shards(tmp_path):
+    df = load_events(sample_frac=1.0, max_users=60, max_items=40, nrows=4000)
+    model = RecommenderSystem()
+    model.train(df)
+    root = str(tmp_path)
+    build_shards(model, root, 3)
+    servers = [ShardServer(root, i) for i in range(3)]
+    threads = [threading.Thread(target=s.serve_forever, daemon=True) for s in servers]
+    for t in threads:
+        t.start()
+    yield model, root
+    for s in servers:
+        s.close()
+
+
+def test_partition_is_stable_and_complete():
+    users = list(range(1000, 1100))
+    parts = partition(users, 4)
+    assert sorted(u for part in parts.values() for u in part) == users
+    assert all(shard_of(u, 4) == s for s, part in parts.items() for u in part)
+
+
+def test_sharded_results_match_single_model(shards):
+    model, root = shards
+    sharded, _, manifest = attach_sharded(root)
+    assert manifest['meta']['n_shards'] == 3
+    users = list(model.users) + [-1]
+    assert sharded.recommend_batch(users, top_k=5) == model.recommend_batch(users, top_k=5)
+    assert sharded.recommend(users[0], top_k=3) == model.recommend(users[0], top_k=3)
+    session = model.items[:3]
+    assert sharded.recommend_for_session(session, top_k=5) == model.recommend_for_session(session, top_k=5)
+    assert len(sharded.router.ping()) == 3
+
+
+def test_unreachable_shard_raises(tmp_path):
+    router = ShardRouter([str(tmp_path / 'missing.sock')], b'key')
+    with pytest.raises(ShardUnavailable):
+        router.recommend_batch([1, 2], top_k=3)
+
+
+def test_shard_key_is_random_and_private(shards):
+    model, root = shards
+    key = shard_authkey(root)
+    assert len(key) == 32
+    assert stat.S_IMODE(os.stat(os.path.join(root, 'authkey')).st_mode) == 0o600
+    # A client with any other key fails the handshake
+    with pytest.raises(ShardUnavailable):
+        ShardRouter([shard_address(root, 0)], b'recsys-shards').ping()
+    assert ShardRouter([shard_address(root, 0)], key).ping()[0]['shard'] == 0
+
+
+def test_batch_endpoint_matches_single_route():
+    app_module.app.config['TESTING'] = True
+    client = app_module.app.test_client()
+    assert app_module.warm()
+    users = app_module.state.model.users[:5]
+    res = client.post('/get_recommendations_batch', json={'user_ids': users + users[:1], 'k': 4})
+    assert res.status_code == 200
+    results = res.get_json()['results']
+    assert [r['user_id'] for r in results] == users + users[:1]
+    for r in results:
+        single = client.get(f"/get_recommendations/{r['user_id']}?k=4").get_json()
+        assert r['items'] == [item['id'] for item in single]
+    assert client.post('/get_recommendations_batch', json={'user_ids': 'x'}).status_code == 400
@@ -0,0 +1,21 @@
+import numpy as np
+from sample_recommender import RecommenderSystem
+from sample_data_loader import load_events
+from backend.shared_model import publish, attach, ManifestWatcher
+
+
+def test_publish_attach_zero_copy_and_reload(tmp_path):
+    df = load_events(sample_frac=1.0, max_users=20, max_items=30, nrows=2000)
+    model = RecommenderSystem()
+    model.train(df)
+    manifest = publish(model, str(tmp_path))
+
+    shared, arrays, _ = attach(str(tmp_path), RecommenderSystem)
+    assert np.shares_memory(shared.user_item_matrix.values, arrays['user_item'])
+    user = model.users[0]
+    assert shared.recommend(user, top_k=5) == model.recommend(user, top_k=5)
+
+    watcher = ManifestWatcher(str(tmp_path), version=manifest['version'], interval=0)
+    assert watcher.poll() is None
+    newer = publish(model, str(tmp_path))
+    assert watcher.poll()['version'] == newer['version']
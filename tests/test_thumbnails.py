@@ -0,0 +1,69 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.thumbnails import ThumbnailStore
+
+JPEG = b'\xff\xd8\xff\xe0' + b'fake-jpeg-body'
+
+
+class SlowImageHandler(BaseHTTPRequestHandler):
+    hits = []
+
+    def do_GET(self):
+        SlowImageHandler.hits.append(self.path)
+        time.sleep(0.2)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.end_headers()
+        self.wfile.write(JPEG)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_fetches_are_deduplicated_and_content_addressed(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        store = ThumbnailStore(str(tmp_path), upstream=base + '/img/{item_id}', max_workers=2)
+        SlowImageHandler.hits.clear()
+
+        assert store.lookup(1) is None
+        first = store.fetch_async(1)
+        assert store.fetch_async(1) is first  # in-flight fetch is shared
+        futures = store.prefetch([2, 3])
+        for f in [first] + futures:
+            f.result(timeout=5)
+
+        assert sorted(SlowImageHandler.hits) == ['/img/1', '/img/2', '/img/3']
+        path1, mimetype = store.lookup(1)
+        assert mimetype == 'image/jpeg'
+        # Identical bytes share one blob
+        assert store.lookup(2)[0] == path1
+        assert open(path1, 'rb').read() == JPEG
+
+        # Failed fetches are remembered and not retried immediately
+        bad = ThumbnailStore(str(tmp_path / 'bad'), upstream=base + '/missing/{item_id}')
+        bad.fetch_async(9).result(timeout=5)
+        assert bad.lookup(9) is None
+        assert bad.fetch_async(9) is None
+    finally:
+        server.shutdown()
+
+
+def test_failures_are_bounded(tmp_path):
+    store = ThumbnailStore(str(tmp_path), max_failed=3, retry_after=300)
+    for item_id in range(10):
+        store._record_failure(item_id)
+    assert list(store._failed) == [7, 8, 9]
+    # Expired failures are dropped on the next failure
+    store.retry_after = 0
+    store._record_failure(10)
+    assert list(store._failed) == []
+    store.shutdown()
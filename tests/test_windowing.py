@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from sample_data_loader import load_events
+from sample_recommender import build_user_item_matrix, time_weighted, RecommenderSystem
+from backend.pipeline import TrainingPipeline
+from backend.windowing import WindowedInteractions
+
+DAY = 86400
+
+
+def test_time_weighted_decays_and_windows():
+    now = 1_700_000_000_000
+    df = pd.DataFrame({
+        'user_id': [1, 1, 2],
+        'product_id': [10, 11, 10],
+        'weight': [1, 3, 5],
+        'timestamp': [now, now - 2 * DAY * 1000, now - 10 * DAY * 1000],
+    })
+    out = time_weighted(df, half_life=2 * DAY, window=7 * DAY)
+    assert out['user_id'].tolist() == [1, 1]
+    assert np.allclose(out['weight'], [1.0, 1.5])
+    matrix = build_user_item_matrix(df, half_life=2 * DAY)
+    assert np.isclose(matrix.loc[2, 10], 5 * 2 ** -5)
+
+
+def test_incremental_window_matches_batch_build():
+    df = load_events(sample_frac=1.0, max_users=50, max_items=60, nrows=5000).sort_values('timestamp')
+    hour = 3600
+    windowed = WindowedInteractions(window=7 * DAY, half_life=2 * DAY, bucket=hour)
+    half = len(df) // 2
+    windowed.add(df.iloc[:half])
+    windowed.add(df.iloc[half:])
+
+    def batch(now):
+        # The window edge moves in whole buckets
+        start = (now - 7 * DAY * 1000) // (hour * 1000) * (hour * 1000)
+        return build_user_item_matrix(df[df['timestamp'] >= start], half_life=2 * DAY, now=now)
+
+    newest = int(df['timestamp'].max())
+    for now in (newest, newest + 3 * DAY * 1000):
+        windowed.expire(now)
+        expected = batch(now)
+        expected = expected.loc[expected.index.isin(windowed.matrix(now).index)]
+        got = windowed.matrix(now).reindex(index=expected.index, columns=expected.columns, fill_value=0)
+        assert np.allclose(got.values, expected.values)
+    model = RecommenderSystem()
+    model.train_windowed(windowed, now)
+    assert set(model.users) < set(df['user_id'])
+    assert model.recommend(model.users[0], top_k=3)
+
+    # Sliding past every event empties the window
+    windowed.expire(newest + 30 * DAY * 1000)
+    assert len(windowed) == 0 and windowed.buckets == {}
+
+
+def test_weighting_changes_only_matrix_and_later_keys(tmp_path):
+    plain = TrainingPipeline(str(tmp_path))
+    decayed = TrainingPipeline(str(tmp_path), weighting={'half_life': 2 * DAY, 'window': None})
+    assert plain.key('ingest') == decayed.key('ingest')
+    assert plain.key('matrix') != decayed.key('matrix')
+    assert TrainingPipeline(str(tmp_path), weighting={}).key('matrix') == plain.key('matrix')
+
+
+def test_decayed_history_is_still_excluded_at_reduced_precision():
+    # A year-old event decays far below float16's range but is still history
+    now = 1_700_000_000_000
+    events = pd.DataFrame({
+        'timestamp': [now - 365 * DAY * 1000, now, now, now, now],
+        'user_id': [1, 1, 2, 2, 2],
+        'product_id': [10, 11, 10, 11, 12],
+        'weight': [1, 1, 5, 1, 1],
+    })
+    for precision in ('float32', 'float16', 'int8'):
+        model = RecommenderSystem(precision=precision)
+        model.train(events, half_life=DAY)
+        assert model.recommend(1, top_k=1) == [12], precision